@@ -4,20 +4,57 @@ import logging
 from aiohttp import ClientSession
 import platform
 
+from common import profiling, runtime, tasks, transport
+from common.status import clock_status, deadline_status, scheduler_status
+from common.farming import FarmingManager
+from common.ledger import LEDGER
+from common.shutdown import DRAIN
+from common.scheduler import Scheduler
+from common.singleflight import SingleFlight
+from common.cli import parse_args
+from common.clock import SYSTEM_CLOCK, ServerClock
+from common.metrics import REGISTRY
 
+
+BASE_URL = "https://game-domain.blum.codes/api/v1"
 MAX_POINTS = 280
+# re-read the pass count from the server every this many games
+PASS_RECONCILE_EVERY = 10
+MAX_GAME_ERRORS = 3
+# seconds a game runs before its reward is claimed, and between games
+GAME_DURATION = 30.0
+GAME_INTERVAL = 10.0
 
 logging.basicConfig(level=logging.INFO)
 
 
 class BlumGame:
-    def __init__(self, access_token: str):
+    # live settings, see common.settings
+    SETTINGS = {"game_duration": float, "game_interval": float}
+
+    def __init__(
+        self,
+        access_token: str,
+        clock=SYSTEM_CLOCK,
+        session_factory=aiohttp.ClientSession,
+        base_url: str = BASE_URL,
+    ):
         self.access_token = access_token
-        self.base_url = "https://game-domain.blum.codes/api/v1"
+        self.session_factory = session_factory
+        self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
         }
+        self.clock = ServerClock(__package__, clock)
+        self.scheduler = Scheduler(self.clock)
+        self.single_flight = SingleFlight(__package__)
+        self.farming = FarmingManager(self, self.scheduler)
+        self.game_duration = GAME_DURATION
+        self.game_interval = GAME_INTERVAL
+        # live state for the status endpoint
+        self.play_passes: int | None = None
+        self.balance = None
 
     async def _request(
         self,
@@ -28,10 +65,20 @@ class BlumGame:
         **kwargs,
     ):
         url = f"{self.base_url}{endpoint}"
+        REGISTRY.counter("blum.requests").inc()
+        REGISTRY.counter(f"blum.requests.{method} {endpoint}").inc()
+        sent_at = self.clock.time()
         try:
-            async with session.request(
+            async with DRAIN.request(), session.request(
                 method, url, headers=self.headers, **kwargs
             ) as response:
+                received_at = self.clock.time()
+                REGISTRY.histogram("blum.request_seconds").observe(
+                    received_at - sent_at
+                )
+                self.clock.observe_date_header(
+                    response.headers.get("Date"), sent_at, received_at
+                )
                 response.raise_for_status()
 
                 if is_response_json:
@@ -39,9 +86,25 @@ class BlumGame:
                 else:
                     return await response.text()
         except aiohttp.ClientError as e:
+            REGISTRY.counter("blum.request_errors").inc()
             logging.error(f"Request failed: {e}")
             raise
 
+    async def warm_up(self, session: ClientSession):
+        # resolves the host and leaves an open connection in the session's
+        # pool ahead of the requests that matter (see common.warmup); the
+        # response itself does not matter
+        started = self.clock.monotonic()
+        try:
+            async with session.request("HEAD", self.base_url):
+                pass
+        except aiohttp.ClientError as e:
+            logging.warning(f"Warm-up failed: {e}")
+            return
+        REGISTRY.histogram("blum.warmup_seconds").observe(
+            self.clock.monotonic() - started
+        )
+
     async def start_farming(self, session: ClientSession) -> str:
         data = await self._request(session, "POST", "/farming/start")
         # {
@@ -52,10 +115,19 @@ class BlumGame:
         # }
         return data
 
-    async def claim_farming(self, session: ClientSession, farming_id: str):
+    async def claim_farming(
+        self, session: ClientSession, farming_id: str | None = None
+    ):
         data = await self._request(session, "POST", "/farming/claim")
         return data
 
+    def farming_end_time(self, data: dict) -> float | None:
+        # start response, or the "farming" object of the balance; times are in ms
+        farming = data.get("farming", data) if data else None
+        if not farming or not farming.get("endTime"):
+            return None
+        return farming.get("endTime") / 1000
+
     async def start_game_session(self, session: ClientSession) -> str:
         data = await self._request(session, "POST", "/game/play")
         return data.get("gameId")
@@ -65,52 +137,132 @@ class BlumGame:
         data = await self._request(
             session, "POST", "/game/claim", json=payload, is_response_json=False
         )
+        LEDGER.record(__package__, "game", points)
         return data
 
     async def get_balance(self, session: ClientSession):
-        return await self._request(session, "GET", "/user/balance")
+        return await self.single_flight.do(
+            ("balance", session),
+            lambda: self._request(session, "GET", "/user/balance"),
+        )
 
-    async def play_game(self):
-        async with aiohttp.ClientSession() as session:
+    async def play_game(self, session: ClientSession):
+        # passes only change through our own claims, so the balance is read
+        # once and the passes are counted down locally; the server count is
+        # re-read every PASS_RECONCILE_EVERY games and after an error
+        self.play_passes = None
+        games_since_reconcile = 0
+        errors = 0
+        while True:
             try:
-                while True:
+                if (
+                    self.play_passes is None
+                    or games_since_reconcile >= PASS_RECONCILE_EVERY
+                ):
                     balance = await self.get_balance(session)
-                    current_balance = balance.get("availableBalance")
-                    current_game_passes = balance.get("playPasses")
+                    self.play_passes = balance.get("playPasses")
+                    games_since_reconcile = 0
+                    self.balance = balance.get("availableBalance")
+                    logging.info(f"Current balance: {self.balance}")
 
-                    if current_game_passes <= 0:
-                        logging.info("All game passes used, ending game session.")
-                        break
+                if self.play_passes <= 0:
+                    logging.info("All game passes used, ending game session.")
+                    break
 
-                    logging.info(f"Current balance: {current_balance}")
-                    logging.info(f"Current game passes: {current_game_passes}")
+                logging.info(f"Current game passes: {self.play_passes}")
 
-                    game_id = await self.start_game_session(session)
-                    logging.info(f"Game started with ID: {game_id}")
+                game_id = await self.start_game_session(session)
+                logging.info(f"Game started with ID: {game_id}")
 
-                    logging.info("Waiting for game session to end...")
-                    await asyncio.sleep(30)  # Wait 30 seconds before claiming
+                logging.info("Waiting for game session to end...")
+                await self.clock.sleep(self.game_duration)
 
-                    result = await self.claim_rewards(
-                        session, game_id, points=MAX_POINTS
-                    )
-                    logging.info(f"Rewards claimed: {result}")
+                result = await self.claim_rewards(session, game_id, points=MAX_POINTS)
+                logging.info(f"Rewards claimed: {result}")
+                self.play_passes -= 1
+                games_since_reconcile += 1
+                errors = 0
 
-                    if current_game_passes - 1 == 0:
-                        logging.info("All game passes used, ending game session.")
-                        break
-                    logging.info("Sleeping for 10 seconds before new game...")
-                    await asyncio.sleep(10)
+                if self.play_passes == 0:
+                    logging.info("All game passes used, ending game session.")
+                    break
+                logging.info(
+                    f"Sleeping for {self.game_interval} seconds before new game..."
+                )
+                await self.clock.sleep(self.game_interval)
 
             except Exception as e:
                 logging.error(f"Unexpected error: {e}")
+                errors += 1
+                if errors >= MAX_GAME_ERRORS:
+                    break
+                # re-read the passes from the server before the next game
+                self.play_passes = None
+
+        REGISTRY.log("blum.")
+
+    def status(self) -> dict:
+        return {
+            "balance": self.balance,
+            "play_passes": self.play_passes,
+            "farming": {
+                "end": deadline_status(self.clock, self.farming.end_time),
+                "rounds": self.farming.rounds,
+            },
+            "wakeups": scheduler_status(self.scheduler),
+            "clock": clock_status(self.clock),
+        }
+
+    def state(self) -> dict:
+        return {"farming_end": self.farming.end_time}
+
+    def restore(self, data: dict):
+        # a round end still in the future saves the first balance read
+        self.farming.end_time = data.get("farming_end")
+
+    async def run_farming(self, session: ClientSession):
+        await tasks.supervise(
+            "Farming",
+            lambda: self.farming.run(session),
+            sleep=self.clock.sleep,
+        )
+
+    async def run(self, wrap=None):
+        # the jobs share one session: with --transport http2 their concurrent
+        # requests are multiplexed on one connection. `wrap(name, coro)` is
+        # profiling.SamplingProfiler.wrap
+        wrap = wrap or (lambda name, coro: coro)
+        async with self.session_factory() as session:
+            await self.warm_up(session)
+            async with asyncio.TaskGroup() as group:
+                group.create_task(
+                    wrap("BlumGame.play_game", self.play_game(session))
+                )
+                group.create_task(
+                    wrap("BlumGame.run_farming", self.run_farming(session))
+                )
 
 
 def main():
+    args = parse_args(__package__)
+    profiler = profiling.setup(args)
+
     access_token = input("Enter your access token: ").strip()
-    blum_game = BlumGame(access_token)
+    blum_game = BlumGame(
+        access_token, session_factory=transport.session_factory(args.transport)
+    )
 
     if platform.system() == "Windows":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    asyncio.run(blum_game.play_game())
+    try:
+        asyncio.run(
+            runtime.run(
+                args,
+                blum_game.run(profiler.wrap),
+                games={"blum": blum_game},
+                profiler=profiler,
+            )
+        )
+    finally:
+        profiler.stop()
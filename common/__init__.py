@@ -0,0 +1 @@
+# Shared runtime helpers used by the blum, tomarket and memefi entry points.
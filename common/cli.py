@@ -0,0 +1,80 @@
+import argparse
+
+from common.ledger import LEDGER_DIR
+from common.shutdown import DRAIN_TIMEOUT
+from common.state import STATE_DIR
+from common.transport import TRANSPORTS
+
+
+def build_parser(prog: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=prog)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="start the sampling profiler immediately (it can also be toggled with SIGUSR2)",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="directory for collapsed-stack and per-coroutine profile dumps",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=0.005,
+        help="sampling interval in seconds",
+    )
+    parser.add_argument(
+        "--block-threshold",
+        type=float,
+        default=0.25,
+        help="seconds the event loop may be blocked before its stack is logged",
+    )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        help="serve game state on http://STATUS_HOST:PORT/status and /healthz",
+    )
+    parser.add_argument("--status-host", default="127.0.0.1")
+    parser.add_argument(
+        "--ledger-dir",
+        default=LEDGER_DIR,
+        help="directory of the earnings ledger (read it with python -m common.ledger)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="sample RSS and tracemalloc and report the top growing allocation sites",
+    )
+    parser.add_argument(
+        "--memory-interval",
+        type=float,
+        default=60.0,
+        help="seconds between memory samples with --trace-memory",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=DRAIN_TIMEOUT,
+        help="seconds requests in flight get to finish on SIGINT / SIGTERM",
+    )
+    parser.add_argument(
+        "--state-dir",
+        default=STATE_DIR,
+        help="where the nonce and the farming / check-in deadlines survive restarts",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default="aiohttp",
+        help="HTTP client of blum and tomarket; http2 multiplexes one connection",
+    )
+    parser.add_argument(
+        "--config",
+        help="JSON file of live game settings, reloaded on SIGHUP or when it changes",
+    )
+    return parser
+
+
+def parse_args(prog: str, argv: list[str] | None = None) -> argparse.Namespace:
+    return build_parser(prog).parse_args(argv)
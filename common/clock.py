@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import email.utils
+import functools
+import heapq
+import time
+
+from common.metrics import REGISTRY
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_iso8601(value: str) -> float:
+    # "2024-09-02T17:57:27.000Z" -> unix seconds. The same few deadlines are
+    # parsed over and over in the loops, hence the cache.
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+# Clocks give the games their notion of time: `time()` (unix seconds),
+# `monotonic()` and `sleep()`. SystemClock is the real thing, VirtualClock
+# lets tests and benchmarks run hours of play in milliseconds.
+class SystemClock:
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, delay: float):
+        await asyncio.sleep(delay)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock:
+    # Sleepers are parked on futures; once every task is blocked (the loop
+    # has nothing ready to run), time jumps straight to the earliest deadline.
+    # Only meant for in-process backends: a task waiting on real I/O looks
+    # idle too, and time would jump past it.
+    def __init__(self, start: float | None = None):
+        self._now = time.time() if start is None else start
+        self._sleepers: list = []
+        self._sequence = 0
+        self._advancer: asyncio.Task | None = None
+
+    def time(self) -> float:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    async def sleep(self, delay: float):
+        if delay <= 0:
+            await asyncio.sleep(0)
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._sequence += 1
+        heapq.heappush(self._sleepers, (self._now + delay, self._sequence, future))
+        if self._advancer is None or self._advancer.done():
+            self._advancer = loop.create_task(self._advance())
+        await future
+
+    async def _advance(self):
+        loop = asyncio.get_running_loop()
+        while self._sleepers:
+            # let everything that can run, run
+            await asyncio.sleep(0)
+            if getattr(loop, "_ready", None):
+                continue
+
+            deadline, _, future = heapq.heappop(self._sleepers)
+            if future.done():
+                continue
+            self._now = max(self._now, deadline)
+            future.set_result(None)
+
+
+class ServerClock:
+    # Estimates the offset between the server clock and ours, so deadlines the
+    # server hands out (endsAt, end_at, next_check_ts, ...) can be slept on
+    # directly.
+    #
+    # Every sample is a server timestamp known to fall between sending a
+    # request and receiving its response. The midpoint is taken as the moment
+    # the server stamped it, so a sample is off by at most half the round trip
+    # plus the timestamp resolution. Samples are merged into a running estimate
+    # weighted by that error, and the estimate's own weight decays so the
+    # offset can follow drift.
+    def __init__(
+        self, name: str = "server", base=SYSTEM_CLOCK, decay: float = 0.9
+    ):
+        self.base = base
+        self.offset = 0.0
+        self.error: float | None = None
+        # worst case, rather than statistical, error of the estimate: every
+        # sample is within its own error of the true offset, so their weighted
+        # mean is too
+        self.bound: float | None = None
+        self.samples = 0
+        self.decay = decay
+        self._weight = 0.0
+        self._bound_sum = 0.0
+        self._offset_gauge = REGISTRY.gauge(f"clock.{name}.offset_seconds")
+        self._error_gauge = REGISTRY.gauge(f"clock.{name}.error_seconds")
+
+    def time(self) -> float:
+        return self.base.time()
+
+    def monotonic(self) -> float:
+        return self.base.monotonic()
+
+    async def sleep(self, delay: float):
+        await self.base.sleep(delay)
+
+    def now(self) -> float:
+        return self.time() + self.offset
+
+    def utcnow(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.now(), datetime.timezone.utc)
+
+    def until(self, timestamp: float) -> float:
+        return timestamp - self.now()
+
+    def observe(
+        self,
+        server_time: float,
+        sent_at: float,
+        received_at: float,
+        resolution: float = 0.0,
+    ):
+        # a timestamp truncated to `resolution` was stamped up to one
+        # resolution step after the value it shows
+        server_time += resolution / 2
+        sample = server_time - (sent_at + received_at) / 2
+        error = (received_at - sent_at) / 2 + resolution / 2 + 0.001
+        weight = 1 / error**2
+
+        self._weight *= self.decay
+        self._bound_sum *= self.decay
+        self.offset = (self.offset * self._weight + sample * weight) / (
+            self._weight + weight
+        )
+        self._weight += weight
+        self._bound_sum += weight * error
+        self.error = self._weight**-0.5
+        self.bound = self._bound_sum / self._weight
+        self.samples += 1
+
+        self._offset_gauge.set(self.offset)
+        self._error_gauge.set(self.error)
+
+    def observe_date_header(self, value: str | None, sent_at: float, received_at: float):
+        if not value:
+            return
+        try:
+            server_time = email.utils.parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return
+        self.observe(server_time, sent_at, received_at, resolution=1.0)
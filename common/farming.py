@@ -0,0 +1,52 @@
+import logging
+
+from common.scheduler import Scheduler
+
+
+# Claims and restarts farming the moment a round ends.
+#
+# The game provides start_farming, claim_farming, get_balance, warm_up and
+# farming_end_time(data), which reads the round end (unix seconds) from either
+# a start response or a balance, or returns None when nothing is farming.
+class FarmingManager:
+    def __init__(self, game, scheduler: Scheduler):
+        self.game = game
+        self.scheduler = scheduler
+        self.end_time: float | None = None
+        self.rounds = 0
+
+    async def run(self, session):
+        # an end time still in the future (restored after a restart, or kept
+        # from a failed run) is trusted; if it is wrong the claim fails and the
+        # next run reads the balance
+        if self.end_time is None or self.end_time <= self.scheduler.clock.now():
+            balance = await self.game.get_balance(session)
+            self.end_time = self.game.farming_end_time(balance)
+        if self.end_time is None:
+            logging.info("Farming not running, starting farming...")
+            started = await self.game.start_farming(session)
+            self.end_time = self.game.farming_end_time(started)
+
+        while self.end_time is not None:
+            await self.scheduler.sleep_until(
+                "farming claim",
+                self.end_time,
+                warm=lambda: self.game.warm_up(session),
+            )
+
+            # claim and restart back to back, then refresh the balance once
+            claimed = await self.game.claim_farming(session)
+            started = await self.game.start_farming(session)
+            balance = await self.game.get_balance(session)
+            self.rounds += 1
+            logging.info(f"Farming claimed: {claimed}")
+
+            end_time = self.game.farming_end_time(started)
+            if end_time is None:
+                end_time = self.game.farming_end_time(balance)
+            if end_time is None or end_time <= self.scheduler.clock.now():
+                break
+            self.end_time = end_time
+
+        logging.info("Farming did not restart, stopping farming.")
+        self.end_time = None
@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import struct
+import time
+
+from common.clock import SYSTEM_CLOCK
+from common.metrics import REGISTRY
+
+# Append-only earnings ledger.
+#
+# Every reward (game claims, task scores, coin deltas, tap bot claims, spin
+# rewards) and every booster activation is one record:
+#
+#   u16 length | f64 timestamp | f64 amount | u32 requests | game\0source\0booster
+#
+# `requests` is how many requests the game sent since its previous record, so
+# summing it over a game gives earnings per request. Records are buffered in
+# memory by `record()` and appended by a worker thread every FLUSH_INTERVAL
+# seconds, one file per UTC day: <directory>/YYYY-MM-DD.ledger.
+#
+# `python -m common.ledger` streams the files back and prints earnings per
+# game, per hour, per request and per booster used.
+
+LEDGER_DIR = "ledger"
+FLUSH_INTERVAL = 5.0
+SUFFIX = ".ledger"
+
+_LENGTH = struct.Struct("<H")
+_FIXED = struct.Struct("<ddI")
+_READ_SIZE = 1 << 20
+
+Entry = collections.namedtuple(
+    "Entry", "timestamp game source booster amount requests"
+)
+
+
+def encode(entry: Entry) -> bytes:
+    names = f"{entry.game}\0{entry.source}\0{entry.booster}".encode()
+    body = _FIXED.pack(entry.timestamp, entry.amount, entry.requests) + names
+    return _LENGTH.pack(len(body)) + body
+
+
+def iter_file(path: str):
+    # reads in large blocks and decodes record by record; a record cut short
+    # by a crash mid-write ends the file
+    with open(path, "rb") as f:
+        buffer = b""
+        while True:
+            block = f.read(_READ_SIZE)
+            if not block:
+                break
+            buffer = buffer + block if buffer else block
+            view = memoryview(buffer)
+            offset = 0
+            while offset + _LENGTH.size <= len(buffer):
+                (length,) = _LENGTH.unpack_from(view, offset)
+                end = offset + _LENGTH.size + length
+                if end > len(buffer):
+                    break
+                start = offset + _LENGTH.size
+                timestamp, amount, requests = _FIXED.unpack_from(view, start)
+                game, source, booster = (
+                    bytes(view[start + _FIXED.size : end]).decode().split("\0")
+                )
+                yield Entry(timestamp, game, source, booster, amount, requests)
+                offset = end
+            view.release()
+            buffer = buffer[offset:]
+
+
+def ledger_files(directory: str, since: str | None = None, until: str | None = None):
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SUFFIX))
+    for name in names:
+        day = name[: -len(SUFFIX)]
+        if (since and day < since) or (until and day > until):
+            continue
+        yield os.path.join(directory, name)
+
+
+def iter_entries(directory: str, since: str | None = None, until: str | None = None):
+    for path in ledger_files(directory, since, until):
+        yield from iter_file(path)
+
+
+class Ledger:
+    def __init__(self, registry=REGISTRY):
+        self.directory: str | None = None
+        self.clock = SYSTEM_CLOCK
+        self._registry = registry
+        self._buffer: list[Entry] = []
+        self._requests: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+        self._records = registry.counter("ledger.records")
+        self._flush_seconds = registry.histogram("ledger.flush_seconds")
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    def record(self, game: str, source: str, amount: float, booster: str = ""):
+        # called from the game loops: only appends to the buffer
+        if not self.enabled:
+            return
+        requests = self._registry.counter(f"{game}.requests").value
+        previous = self._requests.get(game, 0)
+        self._requests[game] = requests
+        self._buffer.append(
+            Entry(self.clock.time(), game, source, booster, amount, requests - previous)
+        )
+
+    def start(self, directory: str = LEDGER_DIR, clock=SYSTEM_CLOCK):
+        self.directory = directory
+        self.clock = clock
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await self.clock.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except OSError as e:
+            logging.error(f"Ledger write failed, {len(batch)} records lost: {e}")
+            return
+        self._records.inc(len(batch))
+        self._flush_seconds.observe(time.perf_counter() - started)
+
+    def _write(self, batch: list[Entry]):
+        os.makedirs(self.directory, exist_ok=True)
+        days = collections.defaultdict(list)
+        for entry in batch:
+            at = datetime.datetime.fromtimestamp(entry.timestamp, datetime.timezone.utc)
+            days[at.strftime("%Y-%m-%d")].append(encode(entry))
+        for day, records in days.items():
+            path = os.path.join(self.directory, f"{day}{SUFFIX}")
+            with open(path, "ab") as f:
+                f.write(b"".join(records))
+
+
+LEDGER = Ledger()
+
+
+class _Totals:
+    def __init__(self):
+        self.records = 0
+        self.amount = 0.0
+        self.requests = 0
+        self.first: float | None = None
+        self.last: float | None = None
+
+    def add(self, entry: Entry):
+        self.records += 1
+        self.amount += entry.amount
+        self.requests += entry.requests
+        if self.first is None:
+            self.first = entry.timestamp
+        self.last = entry.timestamp
+
+    @property
+    def hours(self) -> float:
+        if self.first is None:
+            return 0.0
+        return (self.last - self.first) / 3600
+
+
+def summarize(entries, hourly: bool = False) -> dict:
+    # one pass, memory bound by the number of games / sources / boosters (and
+    # hours with `hourly`), not by the number of records
+    games = collections.defaultdict(_Totals)
+    sources = collections.defaultdict(_Totals)
+    boosters = collections.defaultdict(_Totals)
+    activations = collections.Counter()
+    hours = collections.defaultdict(float)
+    for entry in entries:
+        games[entry.game].add(entry)
+        if entry.source == "boost":
+            activations[entry.game, entry.booster] += 1
+            continue
+        sources[entry.game, entry.source].add(entry)
+        if entry.booster:
+            boosters[entry.game, entry.booster].add(entry)
+        if hourly:
+            hours[entry.game, int(entry.timestamp // 3600)] += entry.amount
+    return {
+        "games": games,
+        "sources": sources,
+        "boosters": boosters,
+        "activations": activations,
+        "hours": hours,
+    }
+
+
+def _ratio(numerator: float, denominator: float) -> str:
+    return f"{numerator / denominator:.2f}" if denominator else "-"
+
+
+def report(summary: dict):
+    print(
+        f"{'game':<10} {'records':>9} {'requests':>9} {'earned':>14} "
+        f"{'hours':>8} {'per hour':>12} {'per request':>12}"
+    )
+    for game, totals in sorted(summary["games"].items()):
+        print(
+            f"{game:<10} {totals.records:>9} {totals.requests:>9} "
+            f"{totals.amount:>14.2f} {totals.hours:>8.1f} "
+            f"{_ratio(totals.amount, totals.hours):>12} "
+            f"{_ratio(totals.amount, totals.requests):>12}"
+        )
+
+    print(f"\n{'game':<10} {'source':<16} {'records':>9} {'earned':>14}")
+    for (game, source), totals in sorted(summary["sources"].items()):
+        print(f"{game:<10} {source:<16} {totals.records:>9} {totals.amount:>14.2f}")
+
+    keys = sorted(set(summary["boosters"]) | set(summary["activations"]))
+    if keys:
+        print(
+            f"\n{'game':<10} {'booster':<16} {'used':>9} {'earned':>14} "
+            f"{'per booster':>12}"
+        )
+    for game, booster in keys:
+        used = summary["activations"][game, booster]
+        earned = summary["boosters"][game, booster].amount
+        print(
+            f"{game:<10} {booster:<16} {used:>9} {earned:>14.2f} "
+            f"{_ratio(earned, used):>12}"
+        )
+
+    if summary["hours"]:
+        print(f"\n{'game':<10} {'hour (UTC)':<16} {'earned':>14}")
+    for (game, hour), amount in sorted(summary["hours"].items()):
+        start = datetime.datetime.fromtimestamp(hour * 3600, datetime.timezone.utc)
+        print(f"{game:<10} {start:%Y-%m-%d %H:00} {amount:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="common.ledger")
+    parser.add_argument("--dir", default=LEDGER_DIR, help="ledger directory")
+    parser.add_argument("--since", help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", help="last day, YYYY-MM-DD")
+    parser.add_argument("--game", help="only this game")
+    parser.add_argument(
+        "--hourly", action="store_true", help="also print earnings per hour"
+    )
+    args = parser.parse_args()
+
+    entries = iter_entries(args.dir, args.since, args.until)
+    if args.game:
+        entries = (entry for entry in entries if entry.game == args.game)
+    report(summarize(entries, hourly=args.hourly))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import socket
+import time
+import urllib.parse
+import urllib.request
+
+import aiohttp
+
+from common import mock_backend, transport
+from common.metrics import REGISTRY
+from common.watchdog import LoopWatchdog
+
+# Load generator: N clients of one game class in a single process, against the
+# HTTP stand-in from common.mock_backend running in a separate process.
+#
+#   python -m common.loadgen blum --clients 1,10,100,1000 --duration 60
+#
+# Each step runs in a fresh process, so the registry, the RSS peak and the CPU
+# counters start from zero. Requests go through the real client transports
+# (aiohttp / curl_cffi), the game loops and logging run unchanged; the result
+# is throughput, client-side request latency, event-loop lag, peak RSS and
+# CPU use (in total and in milliseconds per request) as the client count grows,
+# and how many connections the server saw.
+#
+# --transport http2 runs blum / tomarket on the HTTP/2 transport against the
+# stand-in served by hypercorn, to compare with aiohttp's HTTP/1.1.
+
+
+def _client(game_name: str, index: int, base_url: str, session_factory):
+    token = f"loadgen-{index}"
+    if game_name == "blum":
+        from blum import BlumGame
+
+        game = BlumGame(token, base_url=base_url, **session_factory)
+        return [game.run()]
+    if game_name == "tomarket":
+        from tomarket import TomarketGame
+
+        game = TomarketGame(token, base_url=base_url, **session_factory)
+        return [game.run()]
+
+    from memefi import MemefiGame, MAX_TAPS_COUNT
+
+    game = MemefiGame(
+        token,
+        max_allowed_turbo_boosts=3,
+        max_allowed_recharge_boosts=3,
+        tap_bot=True,
+        url=base_url,
+        **session_factory,
+    )
+    return [game.play_game(taps_count=MAX_TAPS_COUNT)]
+
+
+async def _run_clients(
+    game_name: str,
+    clients: int,
+    duration: float,
+    base_url: str,
+    shared: bool,
+    transport_name: str,
+) -> dict:
+    watchdog = LoopWatchdog()
+    watchdog.start()
+
+    # one connection pool for every client instead of one per client;
+    # memefi's curl_cffi sessions can not share one, it always uses its own
+    connector = None
+    shared_session = None
+    session_factory = {}
+    if game_name != "memefi" and transport_name == "http2":
+        if shared:
+            shared_session = transport.Http2Session()
+            session_factory["session_factory"] = lambda: contextlib.nullcontext(
+                shared_session
+            )
+        else:
+            session_factory["session_factory"] = transport.Http2Session
+    elif shared and game_name != "memefi":
+        connector = aiohttp.TCPConnector(limit=0)
+        session_factory["session_factory"] = lambda: aiohttp.ClientSession(
+            connector=connector, connector_owner=False
+        )
+
+    jobs = []
+    for i in range(clients):
+        jobs.extend(_client(game_name, i, base_url, session_factory))
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(job) for job in jobs]
+    await asyncio.wait(tasks, timeout=duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    await watchdog.stop()
+    if connector is not None:
+        await connector.close()
+    if shared_session is not None:
+        await shared_session.close()
+
+    metrics = REGISTRY.snapshot()
+    latency = metrics.get(f"{game_name}.request_seconds") or {}
+    lag = metrics.get("event_loop.lag_seconds") or {}
+    requests = metrics.get(f"{game_name}.requests") or 0
+    return {
+        "clients": clients,
+        "requests": requests,
+        "errors": metrics.get(f"{game_name}.request_errors") or 0,
+        "throughput": requests / wall,
+        "latency_p50": latency.get("p50"),
+        "latency_p99": latency.get("p99"),
+        "lag_p99": lag.get("p99"),
+        "lag_max": lag.get("max"),
+        "blocked": metrics.get("event_loop.blocked_callbacks") or 0,
+        # ru_maxrss is in KiB on Linux
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "cpu": cpu / wall,
+        "cpu_per_request": cpu / requests if requests else None,
+    }
+
+
+def run_step(
+    game_name: str,
+    clients: int,
+    duration: float,
+    base_url: str,
+    shared: bool,
+    transport_name: str,
+    log_file: str,
+) -> dict:
+    # the game modules call basicConfig at import, configure logging first;
+    # what they print goes to the same place
+    logging.basicConfig(filename=log_file, level=logging.INFO)
+    with open(log_file, "a") as out, contextlib.redirect_stdout(out):
+        return asyncio.run(
+            _run_clients(
+                game_name, clients, duration, base_url, shared, transport_name
+            )
+        )
+
+
+def _serve(game_name: str, host: str, port: int, latency: float, http2: bool):
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(mock_backend.serve(game_name, host, port, latency, http2=http2))
+
+
+def _connections(host: str, port: int) -> int:
+    with urllib.request.urlopen(f"http://{host}:{port}/_stats") as response:
+        return json.load(response)["connections"]
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _base_url(game_name: str, host: str, port: int) -> str:
+    if game_name == "blum":
+        from blum import BASE_URL
+    elif game_name == "tomarket":
+        from tomarket import BASE_URL
+    else:
+        from memefi import GRAPHQL_URL as BASE_URL
+    return f"http://{host}:{port}{urllib.parse.urlsplit(BASE_URL).path}"
+
+
+def _format(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="common.loadgen")
+    parser.add_argument("game", choices=sorted(mock_backend.BACKENDS))
+    parser.add_argument(
+        "--clients", default="1,10,100", help="comma separated client counts"
+    )
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument(
+        "--shared-session",
+        action="store_true",
+        help="share one aiohttp connection pool between the clients",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=transport.TRANSPORTS,
+        default="aiohttp",
+        help="blum / tomarket HTTP client; http2 needs hypercorn for the server",
+    )
+    parser.add_argument("--log-file", default=os.devnull, help="game logs")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(
+        target=_serve,
+        args=(
+            args.game,
+            args.host,
+            args.port,
+            args.latency,
+            args.transport == "http2",
+        ),
+        daemon=True,
+    )
+    server.start()
+    try:
+        _wait_for_port(args.host, args.port)
+        base_url = _base_url(args.game, args.host, args.port)
+
+        print(
+            f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>9} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'lag p99':>8} {'lag max':>8} "
+            f"{'blocked':>8} {'rss MB':>8} {'cpu':>6} {'cpu/req':>8} {'conns':>6}"
+        )
+        for clients in (int(n) for n in args.clients.split(",")):
+            connections = _connections(args.host, args.port)
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                step = pool.submit(
+                    run_step,
+                    args.game,
+                    clients,
+                    args.duration,
+                    base_url,
+                    args.shared_session,
+                    args.transport,
+                    args.log_file,
+                ).result()
+            connections = _connections(args.host, args.port) - connections
+            ms = {
+                key: None if step[key] is None else step[key] * 1000
+                for key in (
+                    "latency_p50",
+                    "latency_p99",
+                    "lag_p99",
+                    "lag_max",
+                    "cpu_per_request",
+                )
+            }
+            print(
+                f"{step['clients']:>8} {step['requests']:>9} {step['errors']:>7} "
+                f"{step['throughput']:>9.1f} "
+                f"{_format(ms['latency_p50'], '8.1f')} "
+                f"{_format(ms['latency_p99'], '8.1f')} "
+                f"{_format(ms['lag_p99'], '8.1f')} "
+                f"{_format(ms['lag_max'], '8.1f')} {step['blocked']:>8} "
+                f"{step['rss_mb']:>8.1f} {step['cpu']:>6.0%} "
+                f"{_format(ms['cpu_per_request'], '8.3f')} {connections:>6}"
+            )
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
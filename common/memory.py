@@ -0,0 +1,162 @@
+import asyncio
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+import types
+
+from common.metrics import REGISTRY
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Opt-in memory instrumentation (--trace-memory).
+#
+# Every `interval` seconds: RSS, the tracemalloc total and the number of live
+# gc objects go to the registry, and the tracemalloc snapshot is diffed
+# against the previous one; the allocation sites that grew the most are
+# logged and kept in the `memory.top_growth` gauge. The objects reachable
+# from each game client are counted too, so growth can be pinned on a client.
+#
+# Leak detection: traced memory growing for LEAK_INTERVALS intervals in a row
+# logs a warning with the top growth sites and bumps memory.leak_alerts.
+
+TRACE_FRAMES = 5
+TOP_SITES = 10
+LEAK_INTERVALS = 5
+# cap on the objects walked per client, the walk runs on the event loop
+MAX_WALK_OBJECTS = 200_000
+
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>")
+# shared infrastructure, not owned by a client
+_OPAQUE = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.CodeType,
+    types.FrameType,
+    asyncio.AbstractEventLoop,
+    asyncio.Future,
+)
+
+
+def rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    # peak rather than current; KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reachable(root) -> tuple[int, int]:
+    # objects and (shallow) bytes reachable from `root`
+    seen = {id(root)}
+    stack = [root]
+    count = 0
+    size = 0
+    while stack and count < MAX_WALK_OBJECTS:
+        obj = stack.pop()
+        count += 1
+        size += sys.getsizeof(obj)
+        for referent in gc.get_referents(obj):
+            if id(referent) in seen or isinstance(referent, _OPAQUE):
+                continue
+            seen.add(id(referent))
+            stack.append(referent)
+    return count, size
+
+
+class MemoryMonitor:
+    def __init__(self, games: dict, interval: float = 60.0, registry=REGISTRY):
+        self.games = games
+        self.interval = interval
+        self._registry = registry
+        self._rss = registry.gauge("memory.rss_bytes")
+        self._traced = registry.gauge("memory.traced_bytes")
+        self._gc_objects = registry.gauge("memory.gc_objects")
+        self._top_growth = registry.gauge("memory.top_growth")
+        self._leak_alerts = registry.counter("memory.leak_alerts")
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._last_traced: int | None = None
+        self._growing = 0
+        self._task: asyncio.Task | None = None
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._started_tracing = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sample()
+            except Exception as e:
+                logging.error(f"Memory sample failed: {e}")
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces(
+            [tracemalloc.Filter(False, name) for name in _IGNORED_FILES]
+        )
+
+    async def sample(self):
+        self._rss.set(rss_bytes())
+        self._gc_objects.set(len(gc.get_objects()))
+        for name, game in self.games.items():
+            count, size = reachable(game)
+            self._registry.gauge(f"memory.{name}.objects").set(count)
+            self._registry.gauge(f"memory.{name}.bytes").set(size)
+
+        traced, _ = tracemalloc.get_traced_memory()
+        self._traced.set(traced)
+
+        # snapshots are copies, filtering and diffing them can leave the loop
+        snapshot = await asyncio.to_thread(self._take_snapshot)
+        if self._snapshot is not None:
+            stats = await asyncio.to_thread(
+                snapshot.compare_to, self._snapshot, "lineno"
+            )
+            top = [str(stat) for stat in stats[:TOP_SITES] if stat.size_diff > 0]
+            self._top_growth.set(top)
+            if top:
+                logging.info("Top memory growth:\n  " + "\n  ".join(top))
+        self._snapshot = snapshot
+
+        if self._last_traced is not None and traced > self._last_traced:
+            self._growing += 1
+        else:
+            self._growing = 0
+        self._last_traced = traced
+        if self._growing >= LEAK_INTERVALS:
+            self._leak_alerts.inc()
+            self._growing = 0
+            logging.warning(
+                f"Traced memory grew for {LEAK_INTERVALS} intervals in a row, "
+                f"now {traced / 2**20:.1f} MiB; top growth:\n  "
+                + "\n  ".join(self._top_growth.value or [])
+            )
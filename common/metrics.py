@@ -0,0 +1,106 @@
+import collections
+import logging
+import threading
+
+# Tiny in-process metrics registry. Everything is kept in memory and read back
+# with `snapshot()`; the loops log it periodically.
+
+
+class Counter:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: int | float = 1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    # keeps the last `window` observations, percentiles are computed on read
+    def __init__(self, name: str, window: int = 2048):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self._values = collections.deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self._values.append(value)
+
+    @staticmethod
+    def _pick(values: list, q: float):
+        return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+    def percentile(self, q: float) -> float | None:
+        if not self._values:
+            return None
+        return self._pick(sorted(self._values), q)
+
+    def snapshot(self):
+        values = sorted(self._values)
+        if not values:
+            return {"count": self.count}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "p50": self._pick(values, 50),
+            "p90": self._pick(values, 90),
+            "p99": self._pick(values, 99),
+            "max": values[-1],
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(Counter, name)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(Gauge, name)
+
+    def histogram(self, name: str, window: int = 2048) -> Histogram:
+        return self._get(Histogram, name, window=window)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: metric.snapshot()
+            for metric in sorted(metrics, key=lambda m: m.name)
+        }
+
+    def log(self, prefix: str = ""):
+        for name, value in self.snapshot().items():
+            if name.startswith(prefix):
+                logging.info(f"metric {name}: {value}")
+
+
+REGISTRY = Registry()
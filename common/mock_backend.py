@@ -0,0 +1,811 @@
+import argparse
+import asyncio
+import collections
+import datetime
+import email.utils
+import functools
+import json
+import logging
+import random
+import secrets
+import time
+import urllib.parse
+import uuid
+
+from aiohttp import web
+
+from common.clock import SYSTEM_CLOCK, VirtualClock
+
+# In-process stand-ins for the blum, tomarket and memefi APIs, plus sessions
+# that look like aiohttp.ClientSession / curl_cffi AsyncSession and talk to
+# them directly. Together with VirtualClock they let a game class run whole
+# sessions with no network and no real waiting:
+#
+#   clock = VirtualClock()
+#   backend = BlumBackend(clock)
+#   game = BlumGame("token", clock=clock, session_factory=backend.aiohttp_session)
+#
+# or from the command line: python -m common.mock_backend blum --hours 12
+#
+# `serve()` (--serve PORT) exposes the same backends over HTTP on the real
+# clock, one account per Authorization header, for load tests that should go
+# through the real transports. With http2 (--http2) it is served by
+# hypercorn, which speaks HTTP/1.1 and cleartext HTTP/2 (prior knowledge);
+# hypercorn is only needed for that: pip install hypercorn.
+# GET /_stats returns the number of client connections and requests seen.
+
+
+class MockHTTPError(Exception):
+    def __init__(self, status: int, body):
+        super().__init__(f"{status}: {body}")
+        self.status = status
+        self.body = body
+
+
+class _MockResponse:
+    def __init__(self, status: int, body, clock):
+        self.status = status
+        self.status_code = status
+        self.body = body
+        self.headers = {
+            "Date": email.utils.formatdate(clock.time(), usegmt=True),
+            "Content-Type": "application/json",
+        }
+        self.content = (body if isinstance(body, str) else json.dumps(body)).encode()
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise MockHTTPError(self.status, self.body)
+
+
+class MockAiohttpResponse(_MockResponse):
+    async def json(self):
+        return json.loads(self.content)
+
+    async def text(self):
+        return self.content.decode()
+
+
+class MockCurlResponse(_MockResponse):
+    def json(self):
+        return json.loads(self.content)
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+
+class _MockSession:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        pass
+
+
+class _AiohttpRequestContext:
+    def __init__(self, backend, method, url, payload):
+        self._call = backend.call(MockAiohttpResponse, method, url, payload)
+
+    async def __aenter__(self):
+        return await self._call
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class MockAiohttpSession(_MockSession):
+    def request(self, method: str, url: str, headers=None, json=None, **kwargs):
+        return _AiohttpRequestContext(self.backend, method, url, json)
+
+
+class MockCurlSession(_MockSession):
+    async def request(self, method: str, url: str, headers=None, json=None, **kwargs):
+        return await self.backend.call(MockCurlResponse, method, url, json)
+
+
+class Backend:
+    def __init__(self, clock, latency: float = 0.05, seed: int = 0):
+        self.clock = clock
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.requests = collections.Counter()
+
+    @property
+    def aiohttp_session(self):
+        return functools.partial(MockAiohttpSession, self)
+
+    @property
+    def curl_session(self):
+        return functools.partial(MockCurlSession, self)
+
+    def round_trip(self) -> float:
+        # jittered, so requests do not all land on the same fraction of a second
+        return self.latency * self.random.uniform(0.5, 1.5)
+
+    def dispatch(self, method: str, path: str, payload) -> tuple[int, object]:
+        self.requests[f"{method} {path}"] += 1
+        if method == "HEAD":
+            # connection warm-ups
+            return 200, ""
+        return self.handle(method, path, payload)
+
+    async def call(self, response_class, method: str, url: str, payload):
+        # half the round trip on the way in, half on the way out
+        latency = self.round_trip()
+        await self.clock.sleep(latency / 2)
+        status, body = self.dispatch(method, urllib.parse.urlsplit(url).path, payload)
+        response = response_class(status, body, self.clock)
+        await self.clock.sleep(latency / 2)
+        return response
+
+    def handle(self, method: str, path: str, payload) -> tuple[int, object]:
+        raise NotImplementedError
+
+
+class BlumBackend(Backend):
+    GAME_DURATION = 30
+    FARMING_DURATION = 8 * 60 * 60
+
+    def __init__(
+        self, clock, play_passes: int = 10, latency: float = 0.05, seed: int = 0
+    ):
+        super().__init__(clock, latency, seed)
+        self.balance = 0.0
+        self.play_passes = play_passes
+        self.games: dict[str, float] = {}
+        self.farming: dict | None = None
+        self.earnings_rate = 0.002
+
+    def _now_ms(self) -> int:
+        return int(self.clock.time() * 1000)
+
+    def handle(self, method, path, payload):
+        if path.endswith("/user/balance"):
+            body = {
+                "availableBalance": f"{self.balance:.2f}",
+                "playPasses": self.play_passes,
+                "timestamp": self._now_ms(),
+            }
+            if self.farming:
+                body["farming"] = self.farming
+            return 200, body
+
+        if path.endswith("/game/play"):
+            if self.play_passes <= 0:
+                return 400, {"message": "not enough play passes"}
+            self.play_passes -= 1
+            game_id = str(uuid.uuid4())
+            self.games[game_id] = self.clock.time()
+            return 200, {"gameId": game_id}
+
+        if path.endswith("/game/claim"):
+            started_at = self.games.pop(payload.get("gameId"), None)
+            if started_at is None:
+                return 400, {"message": "game session not found"}
+            if self.clock.time() - started_at < self.GAME_DURATION:
+                return 400, {"message": "game session not finished"}
+            self.balance += payload.get("points") or 0
+            return 200, "OK"
+
+        if path.endswith("/farming/start"):
+            if not self.farming:
+                start = self._now_ms()
+                self.farming = {
+                    "startTime": start,
+                    "endTime": start + self.FARMING_DURATION * 1000,
+                    "earningsRate": str(self.earnings_rate),
+                    "balance": "0",
+                }
+            return 200, self.farming
+
+        if path.endswith("/farming/claim"):
+            if not self.farming or self._now_ms() < self.farming["endTime"]:
+                return 425, {"message": "farming not finished"}
+            self.balance += self.earnings_rate * self.FARMING_DURATION
+            self.farming = None
+            return 200, {
+                "availableBalance": f"{self.balance:.2f}",
+                "playPasses": self.play_passes,
+                "timestamp": self._now_ms(),
+            }
+
+        return 404, {"message": "not found"}
+
+
+class TomarketBackend(Backend):
+    GAME_DURATION = 30
+    FARMING_DURATION = 3 * 60 * 60
+    FARMING_POINTS = 180
+
+    def __init__(
+        self, clock, play_passes: int = 10, latency: float = 0.05, seed: int = 0
+    ):
+        super().__init__(clock, latency, seed)
+        self.balance = 0
+        self.play_passes = play_passes
+        self.games: dict[str, float] = {}
+        self.farming: dict | None = None
+        self.daily: dict | None = None
+
+    def _ok(self, data):
+        return 200, {"status": 0, "message": "", "data": data}
+
+    def _next_midnight(self, now: float) -> int:
+        today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).date()
+        midnight = datetime.datetime.combine(
+            today + datetime.timedelta(days=1),
+            datetime.time(),
+            datetime.timezone.utc,
+        )
+        return int(midnight.timestamp())
+
+    def handle(self, method, path, payload):
+        now = self.clock.time()
+
+        if path.endswith("/user/balance"):
+            data = {
+                "available_balance": self.balance,
+                "play_passes": self.play_passes,
+                "timestamp": int(now),
+            }
+            if self.farming:
+                data["farming"] = self.farming
+            if self.daily:
+                data["daily"] = self.daily
+            return self._ok(data)
+
+        if path.endswith("/game/play"):
+            if self.play_passes <= 0:
+                return 400, {"status": 400, "message": "not enough play passes"}
+            self.play_passes -= 1
+            round_id = str(uuid.uuid4())
+            self.games[payload.get("game_id")] = now
+            return self._ok({"round_id": round_id})
+
+        if path.endswith("/game/claim"):
+            started_at = self.games.pop(payload.get("game_id"), None)
+            if started_at is None or now - started_at < self.GAME_DURATION:
+                return 400, {"status": 400, "message": "game not finished"}
+            self.balance += payload.get("points") or 0
+            return self._ok("ok")
+
+        if path.endswith("/farming/start"):
+            if not self.farming:
+                self.farming = {
+                    "game_id": payload.get("game_id"),
+                    "round_id": str(uuid.uuid4()),
+                    "start_at": int(now),
+                    "end_at": int(now) + self.FARMING_DURATION,
+                    "last_claim": int(now),
+                    "points": 0,
+                }
+            return self._ok(self.farming)
+
+        if path.endswith("/farming/claim"):
+            if not self.farming or now < self.farming["end_at"]:
+                return 400, {"status": 400, "message": "farming not finished"}
+            self.balance += self.FARMING_POINTS
+            self.farming = None
+            return self._ok({"points": self.FARMING_POINTS})
+
+        if path.endswith("/daily/claim"):
+            if self.daily and now < self.daily["next_check_ts"]:
+                return 400, {"status": 400, "message": "already checked in"}
+            counter = (self.daily or {}).get("check_counter", 0) + 1
+            ymd = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+            self.daily = {
+                "round_id": str(uuid.uuid4()),
+                "start_at": int(now),
+                "last_check_ts": int(now),
+                "last_check_ymd": int(ymd.strftime("%Y%m%d")),
+                "next_check_ts": self._next_midnight(now),
+                "check_counter": counter,
+                "today_points": 100 * counter,
+                "today_game": 1,
+            }
+            self.balance += 100 * counter
+            return self._ok({"today_points": 100 * counter, "today_game": 1})
+
+        if path.endswith("/tasks/hidden"):
+            return self._ok([])
+
+        if path.endswith("/tasks/claim"):
+            return self._ok("ok")
+
+        return 404, {"status": 404, "message": "not found"}
+
+
+def _iso(timestamp: float | None) -> str | None:
+    if timestamp is None:
+        return None
+    value = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+class MemefiBackend(Backend):
+    TURBO_MULTIPLIER = 10
+    TURBO_DURATION = 10
+    TAP_BOT_DURATION = 3 * 60 * 60
+    SPIN_RECHARGE = 60 * 60
+
+    def __init__(
+        self,
+        clock,
+        max_energy: int = 1500,
+        energy_recharge_level: int = 2,
+        weapon_level: int = 2,
+        boss_level: int = 1,
+        max_boss_level: int = 15,
+        base_boss_health: int = 25000,
+        boss_health_growth: float = 1.6,
+        turbo_boosts: int = 3,
+        recharge_boosts: int = 3,
+        spin_energy: int = 25,
+        tap_bot_damage_per_sec: int = 24,
+        tap_bot_attempts: int = 3,
+        daily_combo: str = "1,2,3,4",
+        strict_nonce: bool = False,
+        latency: float = 0.05,
+        seed: int = 0,
+    ):
+        super().__init__(clock, latency, seed)
+        self.coins = 0
+        self.max_energy = max_energy
+        self.energy = float(max_energy)
+        self.energy_at = clock.time()
+        self.energy_recharge_level = energy_recharge_level
+        self.weapon_level = weapon_level
+        self.max_boss_level = max_boss_level
+        self.base_boss_health = base_boss_health
+        self.boss_health_growth = boss_health_growth
+        self.boss_level = boss_level
+        self.boss_health = self.boss_max_health(boss_level)
+        self.turbo_boosts = turbo_boosts
+        self.max_turbo_boosts = turbo_boosts
+        self.turbo_activated_at: float | None = None
+        self.recharge_boosts = recharge_boosts
+        self.max_recharge_boosts = recharge_boosts
+        self.spin_energy = spin_energy
+        self.spin_energy_limit = spin_energy
+        self.spin_recharge_at: float | None = None
+        self.tap_bot_damage_per_sec = tap_bot_damage_per_sec
+        self.tap_bot_attempts = tap_bot_attempts
+        self.tap_bot_used = 0
+        self.tap_bot_started_at: float | None = None
+        self.daily_combo = daily_combo
+        self.strict_nonce = strict_nonce
+        self.nonce = secrets.token_hex(32)
+
+    def boss_max_health(self, level: int) -> int:
+        return int(self.base_boss_health * self.boss_health_growth ** (level - 1))
+
+    def _regen(self):
+        now = self.clock.time()
+        self.energy = min(
+            self.energy + (now - self.energy_at) * (self.energy_recharge_level + 1),
+            self.max_energy,
+        )
+        self.energy_at = now
+
+        if self.spin_recharge_at is not None and now >= self.spin_recharge_at:
+            self.spin_energy = self.spin_energy_limit
+            self.spin_recharge_at = None
+
+    def game_config(self) -> dict:
+        self._regen()
+        return {
+            "_id": "mock",
+            "coinsAmount": self.coins,
+            "currentEnergy": int(self.energy),
+            "maxEnergy": self.max_energy,
+            "weaponLevel": self.weapon_level,
+            "zonesCount": 4,
+            "tapsReward": None,
+            "energyLimitLevel": 1,
+            "energyRechargeLevel": self.energy_recharge_level,
+            "tapBotLevel": 1,
+            "currentBoss": {
+                "_id": f"boss-{self.boss_level}",
+                "level": self.boss_level,
+                "currentHealth": self.boss_health,
+                "maxHealth": self.boss_max_health(self.boss_level),
+            },
+            "freeBoosts": {
+                "_id": "boosts",
+                "currentTurboAmount": self.turbo_boosts,
+                "maxTurboAmount": self.max_turbo_boosts,
+                "turboLastActivatedAt": _iso(self.turbo_activated_at),
+                "turboAmountLastRechargeDate": None,
+                "currentRefillEnergyAmount": self.recharge_boosts,
+                "maxRefillEnergyAmount": self.max_recharge_boosts,
+                "refillEnergyLastActivatedAt": None,
+                "refillEnergyAmountLastRechargeDate": None,
+            },
+            "bonusLeaderDamageEndAt": None,
+            "bonusLeaderDamageStartAt": None,
+            "bonusLeaderDamageMultiplier": 1,
+            "nonce": self.nonce,
+            "spinEnergyNextRechargeAt": _iso(self.spin_recharge_at),
+            "spinEnergyNonRefillable": 0,
+            "spinEnergyRefillable": self.spin_energy,
+            "spinEnergyTotal": self.spin_energy,
+            "spinEnergyStaticLimit": self.spin_energy_limit,
+        }
+
+    def tap_bot_config(self) -> dict:
+        running = self.tap_bot_started_at is not None
+        return {
+            "damagePerSec": self.tap_bot_damage_per_sec,
+            "endsAt": _iso(self.tap_bot_started_at + self.TAP_BOT_DURATION)
+            if running
+            else None,
+            "id": "2" if running else "0",
+            "isPurchased": True,
+            "startsAt": _iso(self.tap_bot_started_at) if running else None,
+            "totalAttempts": self.tap_bot_attempts,
+            "usedAttempts": self.tap_bot_used,
+        }
+
+    def _deal_damage(self, damage: int):
+        dealt = min(damage, self.boss_health)
+        self.boss_health -= dealt
+        self.coins += dealt
+
+    def _process_taps(self, variables: dict):
+        payload = variables.get("payload") or {}
+        if self.strict_nonce and payload.get("nonce") != self.nonce:
+            raise ValueError("Invalid nonce")
+
+        self._regen()
+        taps = payload.get("tapsCount") or 0
+        damage = taps * (self.weapon_level + 1)
+        turbo = (
+            self.turbo_activated_at is not None
+            and self.clock.time() < self.turbo_activated_at + self.TURBO_DURATION
+        )
+        if not turbo:
+            if damage > self.energy:
+                raise ValueError("Not enough energy")
+            self.energy -= damage
+        else:
+            damage *= self.TURBO_MULTIPLIER
+
+        self._deal_damage(damage)
+        self.nonce = secrets.token_hex(32)
+        config = self.game_config()
+        if payload.get("vector") == self.daily_combo:
+            config["tapsReward"] = 100000
+            self.coins += 100000
+        return config
+
+    def _spin(self, variables: dict):
+        self._regen()
+        payload = variables.get("payload") or {}
+        count = min(payload.get("spinsCount") or 0, self.spin_energy)
+        if count <= 0:
+            raise ValueError("Not enough spin energy")
+        self.spin_energy -= count
+        if self.spin_recharge_at is None:
+            self.spin_recharge_at = self.clock.time() + self.SPIN_RECHARGE
+
+        results = []
+        for i in range(count):
+            reward = self.random.choice([0, 0, 100, 500, 1000])
+            self.coins += reward
+            results.append(
+                {
+                    "id": str(i),
+                    "combination": [self.random.choice("ABC") for _ in range(3)],
+                    "rewardAmount": reward,
+                    "rewardType": "COINS",
+                    "questItemsFromSpin": [],
+                }
+            )
+        return {
+            "gameConfig": self.game_config(),
+            "spinResults": results,
+            "spinsProcessedCount": count,
+        }
+
+    def _get_game_config(self, variables: dict):
+        return self.game_config()
+
+    def _get_tap_bot_config(self, variables: dict):
+        return self.tap_bot_config()
+
+    def _activate_booster(self, variables: dict):
+        self._regen()
+        booster = variables.get("boosterType")
+        if booster == "Turbo":
+            if self.turbo_boosts <= 0:
+                raise ValueError("No turbo boosts left")
+            self.turbo_boosts -= 1
+            self.turbo_activated_at = self.clock.time()
+        elif booster == "Recharge":
+            if self.recharge_boosts <= 0:
+                raise ValueError("No recharge boosts left")
+            self.recharge_boosts -= 1
+            self.energy = self.max_energy
+        return self.game_config()
+
+    def _set_next_boss(self, variables: dict):
+        if self.boss_health > 0 or self.boss_level >= self.max_boss_level:
+            raise ValueError("Boss is not defeated")
+        self.boss_level += 1
+        self.boss_health = self.boss_max_health(self.boss_level)
+        return self.game_config()
+
+    def _tap_bot_start(self, variables: dict):
+        if (
+            self.tap_bot_started_at is not None
+            or self.tap_bot_used >= self.tap_bot_attempts
+        ):
+            raise ValueError("Tap bot can not be started")
+        self.tap_bot_used += 1
+        self.tap_bot_started_at = self.clock.time()
+        return self.tap_bot_config()
+
+    def _tap_bot_claim(self, variables: dict):
+        if (
+            self.tap_bot_started_at is None
+            or self.clock.time() < self.tap_bot_started_at + self.TAP_BOT_DURATION
+        ):
+            raise ValueError("Tap bot session not finished")
+        self._deal_damage(self.tap_bot_damage_per_sec * self.TAP_BOT_DURATION)
+        self.tap_bot_started_at = None
+        return self.tap_bot_config()
+
+    OPERATIONS = {
+        "QUERY_GAME_CONFIG": ("telegramGameGetConfig", _get_game_config),
+        "TapbotConfig": ("telegramGameTapbotGetConfig", _get_tap_bot_config),
+        "TapbotStart": ("telegramGameTapbotStart", _tap_bot_start),
+        "TapbotClaim": ("telegramGameTapbotClaimCoins", _tap_bot_claim),
+        "MutationGameProcessTapsBatch": ("telegramGameProcessTapsBatch", _process_taps),
+        "spinSlotMachine": ("slotMachineSpinV2", _spin),
+        "telegramGameActivateBooster": (
+            "telegramGameActivateBooster",
+            _activate_booster,
+        ),
+        "telegramGameSetNextBoss": ("telegramGameSetNextBoss", _set_next_boss),
+    }
+
+    def handle(self, method, path, payload):
+        results = []
+        for operation in payload:
+            name = operation.get("operationName")
+            if name not in self.OPERATIONS:
+                message = f"Unknown operation {name}"
+                results.append({"data": None, "errors": [{"message": message}]})
+                continue
+            field, handler = self.OPERATIONS[name]
+            variables = operation.get("variables") or {}
+            try:
+                results.append({"data": {field: handler(self, variables)}})
+            except ValueError as e:
+                results.append({"data": None, "errors": [{"message": str(e)}]})
+        return 200, results
+
+
+BACKENDS = {
+    "blum": BlumBackend,
+    "tomarket": TomarketBackend,
+    "memefi": MemefiBackend,
+}
+
+
+class _Accounts:
+    # one backend per Authorization header, plus connection / request counts
+    def __init__(self, game_name: str, latency: float, clock):
+        self.game_name = game_name
+        self.latency = latency
+        self.clock = clock
+        self.backends: dict[str, Backend] = {}
+        self.connections: set = set()
+        self.requests = collections.Counter()
+
+    async def respond(
+        self, peer, http_version: str, token: str, method: str, path: str, payload
+    ) -> tuple[int, object]:
+        if path == "/_stats":
+            return 200, {
+                "connections": len(self.connections),
+                "requests": dict(self.requests),
+            }
+
+        self.connections.add(peer)
+        self.requests[f"HTTP/{http_version}"] += 1
+        backend = self.backends.get(token)
+        if backend is None:
+            backend = self.backends[token] = BACKENDS[self.game_name](
+                self.clock, latency=self.latency, seed=len(self.backends)
+            )
+        await self.clock.sleep(backend.round_trip())
+        return backend.dispatch(method, path, payload)
+
+
+def _asgi_app(accounts: _Accounts):
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                await send({"type": message["type"] + ".complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = {
+            name.decode().lower(): value.decode() for name, value in scope["headers"]
+        }
+        status, data = await accounts.respond(
+            tuple(scope.get("client") or ()),
+            scope.get("http_version"),
+            headers.get("authorization", ""),
+            scope["method"],
+            scope["path"],
+            json.loads(body) if body else None,
+        )
+        if isinstance(data, str):
+            content_type, data = b"text/plain", data.encode()
+        else:
+            content_type, data = b"application/json", json.dumps(data).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", content_type)],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+    return app
+
+
+async def _serve_http2(accounts: _Accounts, host: str, port: int):
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    config.accesslog = None
+    logging.info(f"Serving the {accounts.game_name} stand-in on http://{host}:{port}")
+    await hypercorn_serve(_asgi_app(accounts), config)
+
+
+async def serve(
+    game_name: str,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    latency: float = 0.05,
+    clock=SYSTEM_CLOCK,
+    http2: bool = False,
+):
+    accounts = _Accounts(game_name, latency, clock)
+    if http2:
+        await _serve_http2(accounts, host, port)
+        return
+
+    async def handle(request: web.Request) -> web.Response:
+        payload = await request.json() if request.can_read_body else None
+        status, body = await accounts.respond(
+            request.transport.get_extra_info("peername"),
+            f"{request.version.major}.{request.version.minor}",
+            request.headers.get("Authorization", ""),
+            request.method,
+            request.path,
+            payload,
+        )
+        if isinstance(body, str):
+            return web.Response(status=status, text=body)
+        return web.json_response(body, status=status)
+
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Serving the {game_name} stand-in on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_offline(game_name: str, hours: float) -> tuple:
+    clock = VirtualClock()
+
+    if game_name == "blum":
+        from blum import BlumGame
+
+        backend = BlumBackend(clock)
+        game = BlumGame(
+            "mock", clock=clock, session_factory=backend.aiohttp_session
+        )
+        jobs = [game.run()]
+    elif game_name == "tomarket":
+        from tomarket import TomarketGame
+
+        backend = TomarketBackend(clock)
+        game = TomarketGame(
+            "mock", clock=clock, session_factory=backend.aiohttp_session
+        )
+        jobs = [game.run()]
+    else:
+        from memefi import MemefiGame, MAX_TAPS_COUNT
+
+        backend = MemefiBackend(clock)
+        game = MemefiGame(
+            "mock",
+            max_allowed_turbo_boosts=3,
+            max_allowed_recharge_boosts=3,
+            tap_bot=True,
+            clock=clock,
+            session_factory=backend.curl_session,
+        )
+        jobs = [game.play_game(taps_count=MAX_TAPS_COUNT)]
+
+    # run until every job is done or the horizon is reached, whichever is first
+    started = clock.time()
+    tasks = [asyncio.ensure_future(job) for job in jobs]
+    deadline = asyncio.ensure_future(clock.sleep(hours * 3600))
+    pending = set(tasks)
+    while pending and not deadline.done():
+        await asyncio.wait(pending | {deadline}, return_when=asyncio.FIRST_COMPLETED)
+        pending = {task for task in pending if not task.done()}
+    for task in tasks + [deadline]:
+        task.cancel()
+    await asyncio.gather(*tasks, deadline, return_exceptions=True)
+    return game, backend, clock.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="common.mock_backend")
+    parser.add_argument("game", choices=["blum", "tomarket", "memefi"])
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--quiet", action="store_true", help="only log warnings")
+    parser.add_argument(
+        "--serve", type=int, metavar="PORT", help="serve over HTTP instead"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument(
+        "--http2", action="store_true", help="serve HTTP/2 too (needs hypercorn)"
+    )
+    args = parser.parse_args()
+
+    # before the game modules are imported, their basicConfig is then a no-op
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO)
+
+    if args.serve:
+        try:
+            asyncio.run(
+                serve(
+                    args.game, args.host, args.serve, args.latency, http2=args.http2
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+        return
+
+    started = time.perf_counter()
+    game, backend, elapsed = asyncio.run(run_offline(args.game, args.hours))
+    wall = time.perf_counter() - started
+
+    print(f"{elapsed / 3600:.2f}h of virtual time in {wall:.3f}s")
+    for endpoint, count in sorted(backend.requests.items()):
+        print(f"{count:>8}  {endpoint}")
+
+
+if __name__ == "__main__":
+    main()
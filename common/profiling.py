@@ -0,0 +1,205 @@
+import asyncio
+import collections
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+# SIGUSR2 toggles the profiler of a live process: `kill -USR2 <pid>` starts
+# sampling, the next one stops it and writes the dumps. The signal is handled
+# by the event loop while common.runtime.run is running, and ignored outside.
+PROFILE_SIGNAL = getattr(signal, "SIGUSR2", None)
+
+
+class CoroutineStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        self.cpu_time = 0.0
+        self.steps = 0
+
+    def wall_time(self, now: float | None = None) -> float:
+        end = self.finished_at or now or time.perf_counter()
+        return end - self.started_at
+
+
+class _TimedCoroutine:
+    # Drives the wrapped coroutine step by step so the CPU time of every
+    # resumption can be charged to it, while futures are passed through to the
+    # event loop untouched.
+    def __init__(self, coro, stats: CoroutineStats):
+        self._coro = coro
+        self._stats = stats
+
+    def __await__(self):
+        coro = self._coro
+        stats = self._stats
+        value = None
+        error = None
+        while True:
+            started = time.thread_time()
+            try:
+                if error is not None:
+                    yielded = coro.throw(error)
+                else:
+                    yielded = coro.send(value)
+            except StopIteration as e:
+                stats.finished_at = time.perf_counter()
+                return e.value
+            except BaseException:
+                stats.finished_at = time.perf_counter()
+                raise
+            finally:
+                stats.cpu_time += time.thread_time() - started
+                stats.steps += 1
+
+            try:
+                value = yield yielded
+                error = None
+            except BaseException as e:
+                value = None
+                error = e
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir: str = "profiles", interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.stacks: collections.Counter = collections.Counter()
+        self.coroutines: dict[str, CoroutineStats] = {}
+        self._thread_id = threading.main_thread().ident
+        self._sampler: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._window_started_at = 0.0
+        self._window_baseline: dict[str, tuple[float, int]] = {}
+        self._signal = False
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None
+
+    def wrap(self, name: str, coro):
+        stats = CoroutineStats(name)
+        self.coroutines[name] = stats
+
+        async def _run():
+            return await _TimedCoroutine(coro, stats)
+
+        return _run()
+
+    def start(self):
+        with self._lock:
+            if self._sampler is not None:
+                return
+            self.stacks.clear()
+            self._window_started_at = time.perf_counter()
+            self._window_baseline = {
+                name: (stats.cpu_time, stats.steps)
+                for name, stats in self.coroutines.items()
+            }
+            self._stop.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, name="sampling-profiler", daemon=True
+            )
+            self._sampler.start()
+        logging.info(f"Profiler started (interval {self.interval}s)")
+
+    def stop(self) -> str | None:
+        with self._lock:
+            if self._sampler is None:
+                return None
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        path = self.dump()
+        logging.info(f"Profiler stopped, output written to {path}")
+        return path
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def listen(self):
+        if PROFILE_SIGNAL is None:
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                PROFILE_SIGNAL, self._on_signal
+            )
+            self._signal = True
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def unlisten(self):
+        if not self._signal:
+            return
+        asyncio.get_running_loop().remove_signal_handler(PROFILE_SIGNAL)
+        # the loop puts back the default action, which ends the process
+        signal.signal(PROFILE_SIGNAL, signal.SIG_IGN)
+        self._signal = False
+
+    def _on_signal(self):
+        # not in the handler itself: stop() takes the lock, joins the sampler
+        # and writes the dumps, so it runs in a thread instead
+        asyncio.ensure_future(asyncio.to_thread(self.toggle))
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            names.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def dump(self) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        prefix = os.path.join(self.output_dir, f"profile-{os.getpid()}-{stamp}")
+
+        # collapsed-stack format, one "frame;frame;frame count" per line, ready
+        # for flamegraph.pl / speedscope / inferno
+        with open(f"{prefix}.collapsed", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        now = time.perf_counter()
+        window = now - self._window_started_at
+        with open(f"{prefix}.coroutines.txt", "w") as f:
+            f.write(f"window: {window:.3f}s\n")
+            f.write(f"{'coroutine':<40} {'wall':>10} {'cpu':>10} {'off-cpu':>10} {'steps':>8}\n")
+            for name, stats in self.coroutines.items():
+                base_cpu, base_steps = self._window_baseline.get(name, (0.0, 0))
+                started = max(stats.started_at, self._window_started_at)
+                wall = max((stats.finished_at or now) - started, 0.0)
+                cpu = stats.cpu_time - base_cpu
+                f.write(
+                    f"{name:<40} {wall:>9.3f}s {cpu:>9.3f}s {max(wall - cpu, 0.0):>9.3f}s {stats.steps - base_steps:>8}\n"
+                )
+        return prefix
+
+
+def setup(args) -> SamplingProfiler:
+    profiler = SamplingProfiler(args.profile_dir, args.profile_interval)
+
+    if PROFILE_SIGNAL is not None:
+        # until runtime.run hands the signal to the loop, see listen()
+        signal.signal(PROFILE_SIGNAL, signal.SIG_IGN)
+
+    if args.profile:
+        profiler.start()
+    return profiler
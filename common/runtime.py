@@ -0,0 +1,127 @@
+import asyncio
+import logging
+
+from common import state
+from common.ledger import LEDGER
+from common.memory import MemoryMonitor
+from common.settings import SettingsReloader
+from common.shutdown import DRAIN, SHUTDOWN_SIGNALS
+from common.status import StatusServer
+from common.watchdog import LoopWatchdog
+
+
+async def _run_all(coros) -> list:
+    # one failing job cancels the others instead of leaving them running
+    # against a half torn down process
+    async with asyncio.TaskGroup() as group:
+        tasks = [group.create_task(coro) for coro in coros]
+    return [task.result() for task in tasks]
+
+
+# Runs the game coroutines concurrently, together with the process-wide
+# background helpers. `games` ({name: game}) are exposed on the status
+# endpoint when --status-port is set, and their memory is sampled with
+# --trace-memory.
+#
+# SIGINT / SIGTERM start a graceful shutdown: requests in flight get
+# --drain-timeout seconds to finish, then the game tasks are cancelled, which
+# closes their sessions as they unwind; a second signal cancels right away.
+# The games' state is saved to --state-dir on the way out and restored on the
+# next start. After a signal the process exits with SystemExit.
+#
+# With --config the games' settings are loaded from that file before they
+# start (an invalid file stops the start), then reloaded on SIGHUP and when
+# the file changes.
+#
+# A `profiler` (common.profiling) is toggled with SIGUSR2 while the games run.
+async def run(args, *coros, games: dict | None = None, profiler=None):
+    games = games or {}
+    for name, game in games.items():
+        game.restore(state.load(name, args.state_dir))
+    settings = None
+    if args.config:
+        settings = SettingsReloader(args.config, games)
+        try:
+            await settings.load()
+        except (OSError, ValueError) as e:
+            logging.error(f"Invalid settings in {args.config}: {e}")
+            for coro in coros:
+                coro.close()
+            raise SystemExit(1)
+
+    loop = asyncio.get_running_loop()
+    DRAIN.reset()
+    watchdog = LoopWatchdog(threshold=args.block_threshold)
+    memory = None
+    status = None
+    stop = asyncio.Event()
+    jobs = asyncio.ensure_future(_run_all(coros))
+
+    def on_signal():
+        if stop.is_set():
+            jobs.cancel()
+        stop.set()
+
+    handled = []
+    for signum in SHUTDOWN_SIGNALS:
+        try:
+            loop.add_signal_handler(signum, on_signal)
+            handled.append(signum)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl-C still cancels the main task through asyncio.run
+            pass
+
+    if profiler is not None:
+        profiler.listen()
+    watchdog.start()
+    LEDGER.start(args.ledger_dir)
+    if settings is not None:
+        settings.start()
+    stopping = asyncio.ensure_future(stop.wait())
+    try:
+        if args.trace_memory:
+            memory = MemoryMonitor(games, args.memory_interval)
+            memory.start()
+        if args.status_port:
+            status = StatusServer(games, args.status_host, args.status_port)
+            await status.start()
+
+        await asyncio.wait({jobs, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        if stop.is_set() and not jobs.done():
+            logging.info(
+                f"Shutting down, waiting for {DRAIN.in_flight} requests in flight"
+            )
+            if not await DRAIN.drain(args.drain_timeout):
+                logging.warning(
+                    f"{DRAIN.in_flight} requests still in flight after "
+                    f"{args.drain_timeout} seconds, cancelling them"
+                )
+            jobs.cancel()
+        try:
+            return await jobs
+        except asyncio.CancelledError:
+            if not stop.is_set():
+                raise
+            raise SystemExit(0)
+    finally:
+        if not jobs.done():
+            jobs.cancel()
+            await asyncio.gather(jobs, return_exceptions=True)
+        stopping.cancel()
+        if settings is not None:
+            await settings.stop()
+        for signum in handled:
+            loop.remove_signal_handler(signum)
+        if profiler is not None:
+            profiler.unlisten()
+        for name, game in games.items():
+            try:
+                state.save(name, game.state(), args.state_dir)
+            except OSError as e:
+                logging.error(f"Could not save the {name} state: {e}")
+        if status is not None:
+            await status.stop()
+        if memory is not None:
+            await memory.stop()
+        await LEDGER.stop()
+        await watchdog.stop()
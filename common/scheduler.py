@@ -0,0 +1,32 @@
+import logging
+
+from common.clock import ServerClock
+from common.warmup import sleep_warm
+
+
+# Keeps track of when each long-running job of a game wakes up next, so the
+# deadlines can be inspected while the jobs sleep.
+# Deadlines are in server time, see ServerClock.
+class Scheduler:
+    def __init__(self, clock: ServerClock | None = None):
+        self.clock = clock or ServerClock()
+        self.wakeups: dict[str, float] = {}
+
+    # `warm` (optional) re-opens the job's connection just before the deadline,
+    # see common.warmup
+    async def sleep_until(self, name: str, timestamp: float, warm=None):
+        self.wakeups[name] = timestamp
+        try:
+            # wake up late rather than early: the offset estimate can be off by
+            # up to its bound either way
+            delay = self.clock.until(timestamp) + (self.clock.bound or 0.0)
+            if delay > 0:
+                logging.info(f"Next {name} in {delay:.0f} seconds")
+                await sleep_warm(self.clock, delay, warm)
+        finally:
+            self.wakeups.pop(name, None)
+
+    def next_wakeup(self) -> tuple[str, float] | None:
+        if not self.wakeups:
+            return None
+        return min(self.wakeups.items(), key=lambda item: item[1])
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+
+from common.metrics import REGISTRY
+
+# Live settings (--config FILE), reloaded without a restart.
+#
+# The file is a JSON object with a section per game, e.g.
+#
+#   {"memefi": {"max_allowed_turbo_boosts": 20, "tap_bot": true},
+#    "blum": {"game_interval": 15}}
+#
+# Games list what can be changed in a SETTINGS class attribute, {name: type};
+# each setting is the game attribute of the same name, read by the game loops
+# every time they use it. On SIGHUP, or when the file's mtime changes, the
+# whole file is read and validated; if any section is invalid nothing is
+# applied. Otherwise the settings are set on every game in one go, without
+# yielding to the event loop, so no game step sees half a reload. Sessions,
+# the nonce and the deadlines are left alone.
+#
+# Only settings whose value changed since the previous load are applied:
+# the boost allowances count down as boosts are used, and an unrelated edit
+# must not hand the used ones back.
+
+RELOAD_INTERVAL = 2.0
+
+
+class SettingsError(ValueError):
+    pass
+
+
+def validate(name: str, game, section) -> dict:
+    if not isinstance(section, dict):
+        raise SettingsError(f"{name}: expected an object, got {section!r}")
+    allowed = getattr(game, "SETTINGS", {})
+    settings = {}
+    for key, value in section.items():
+        kind = allowed.get(key)
+        if kind is None:
+            raise SettingsError(f"{name}: unknown setting {key!r}")
+        if kind is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        # bool is an int, but `"max_allowed_turbo_boosts": true` is a typo
+        if not isinstance(value, kind) or (
+            kind is not bool and isinstance(value, bool)
+        ):
+            raise SettingsError(
+                f"{name}.{key}: expected {kind.__name__}, got {value!r}"
+            )
+        if kind is not bool and value < 0:
+            raise SettingsError(f"{name}.{key}: must not be negative, got {value!r}")
+        settings[key] = value
+    return settings
+
+
+def current(game) -> dict:
+    return {key: getattr(game, key) for key in getattr(game, "SETTINGS", {})}
+
+
+class SettingsReloader:
+    def __init__(self, path: str, games: dict, registry=REGISTRY):
+        self.path = path
+        self.games = games
+        self._applied: dict[str, dict] = {}
+        self._mtime: int | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._signal = False
+        self._reloads = registry.counter("settings.reloads")
+        self._errors = registry.counter("settings.reload_errors")
+
+    def _read(self) -> tuple[int, dict]:
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path) as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise SettingsError(f"expected an object, got {type(data).__name__}")
+        return mtime, data
+
+    async def load(self):
+        # the first load: errors are the caller's, there is nothing to keep
+        self._mtime, data = await asyncio.to_thread(self._read)
+        self._apply(self._validate(data))
+
+    async def reload(self) -> bool:
+        async with self._lock:
+            try:
+                mtime, data = await asyncio.to_thread(self._read)
+                sections = self._validate(data)
+            except (OSError, ValueError) as e:
+                self._errors.inc()
+                logging.error(
+                    f"Settings in {self.path} not reloaded, keeping them: {e}"
+                )
+                return False
+            self._mtime = mtime
+            self._apply(sections)
+            self._reloads.inc()
+            return True
+
+    def _validate(self, data: dict) -> dict:
+        unknown = set(data) - set(self.games)
+        if unknown:
+            raise SettingsError(f"unknown games: {', '.join(sorted(unknown))}")
+        return {
+            name: validate(name, self.games[name], section)
+            for name, section in data.items()
+        }
+
+    def _apply(self, sections: dict):
+        # no await in here: every game switches over in the same loop step
+        for name, settings in sections.items():
+            applied = self._applied.setdefault(name, {})
+            changed = {
+                key: value
+                for key, value in settings.items()
+                if key not in applied or applied[key] != value
+            }
+            for key, value in changed.items():
+                setattr(self.games[name], key, value)
+            applied.update(changed)
+            if changed:
+                logging.info(f"Applied {name} settings: {changed}")
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self._on_signal)
+            self._signal = True
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # no SIGHUP on Windows, the file is still watched
+            pass
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._signal:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_signal(self):
+        logging.info(f"SIGHUP, reloading {self.path}")
+        asyncio.ensure_future(self.reload())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                # a broken file is reported once, not every interval
+                self._mtime = mtime
+                await self.reload()
@@ -0,0 +1,58 @@
+import asyncio
+import contextlib
+import signal
+
+# Graceful shutdown.
+#
+# Every game request runs inside `DRAIN.request()`. Once a shutdown starts,
+# new requests are parked (they never start, and end when their task is
+# cancelled) while the ones in flight get up to the drain timeout to finish,
+# so a claim the server already accepted is also seen, logged and recorded
+# on our side before the game tasks are cancelled.
+
+DRAIN_TIMEOUT = 10.0
+SHUTDOWN_SIGNALS = tuple(
+    getattr(signal, name) for name in ("SIGINT", "SIGTERM") if hasattr(signal, name)
+)
+
+
+class Drain:
+    def __init__(self):
+        self.stopping = False
+        self.in_flight = 0
+        self._idle: asyncio.Event | None = None
+
+    def reset(self):
+        # events belong to a loop, the entry points may run several
+        self.stopping = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        if self.stopping:
+            await asyncio.get_running_loop().create_future()
+        self.in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        # True when every request in flight finished within the timeout
+        self.stopping = True
+        if self._idle is None:
+            return self.in_flight == 0
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+DRAIN = Drain()
@@ -0,0 +1,36 @@
+import asyncio
+
+from common.metrics import REGISTRY
+
+
+# Collapses concurrent identical reads: while a call for `key` is in flight,
+# later callers await the same task instead of sending their own request, and
+# all of them get the same decoded result (or exception). The call runs as its
+# own task, so one caller being cancelled does not cancel it for the others.
+#
+# `fn` sends the request on a session, which has to be part of `key`: a call
+# left running on a session its caller closed fails for everyone who joined it.
+class SingleFlight:
+    def __init__(self, name: str):
+        self._inflight: dict[object, asyncio.Future] = {}
+        self.calls = REGISTRY.counter(f"{name}.singleflight.calls")
+        self.coalesced = REGISTRY.counter(f"{name}.singleflight.coalesced")
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls.inc()
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced.inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # every caller may have been cancelled: the exception is still
+        # retrieved, instead of logged as never retrieved
+        if not task.cancelled():
+            task.exception()
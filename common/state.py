@@ -0,0 +1,33 @@
+import json
+import logging
+import os
+
+# Small per-game state files, written on shutdown and read back on start so a
+# restart picks up where the last run stopped (the memefi nonce, the farming
+# and daily check-in deadlines): <directory>/<game>.json.
+#
+# Games provide `state() -> dict` and `restore(data)`; the state is a hint,
+# everything in it is re-checked against the server as it is used.
+
+STATE_DIR = "state"
+
+
+def load(name: str, directory: str = STATE_DIR) -> dict:
+    path = os.path.join(directory, f"{name}.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read the state file {path}: {e}")
+        return {}
+
+
+def save(name: str, data: dict, directory: str = STATE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
@@ -0,0 +1,93 @@
+import functools
+import json
+import logging
+import time
+
+from aiohttp import web
+
+from common.metrics import REGISTRY
+from common.settings import current
+
+# Local status endpoint, enabled with --status-port:
+#
+#   GET /healthz  liveness probe; answered by the event loop itself, so any
+#                 answer means the loop is running
+#   GET /status   live state of every game (their `status()`, the next
+#                 scheduled wakeups, their live settings) and the metrics
+#
+# Binds to localhost by default, it is meant for a local supervisor.
+
+
+def deadline_status(clock, timestamp: float | None) -> dict | None:
+    if timestamp is None:
+        return None
+    return {"at": timestamp, "in_seconds": round(clock.until(timestamp), 3)}
+
+
+def scheduler_status(scheduler) -> dict:
+    return {
+        name: deadline_status(scheduler.clock, timestamp)
+        for name, timestamp in scheduler.wakeups.items()
+    }
+
+
+def clock_status(clock) -> dict:
+    return {
+        "offset_seconds": clock.offset,
+        "error_seconds": clock.error,
+        "bound_seconds": clock.bound,
+        "samples": clock.samples,
+    }
+
+
+class StatusServer:
+    def __init__(
+        self,
+        games: dict,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        registry=REGISTRY,
+    ):
+        self.games = games
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._started_at = time.monotonic()
+        self._runner: web.AppRunner | None = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/status", self.status)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Status endpoint on http://{self.host}:{self.port}/status")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _uptime(self) -> float:
+        return round(time.monotonic() - self._started_at, 3)
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "uptime_seconds": self._uptime()})
+
+    async def status(self, request: web.Request) -> web.Response:
+        games = {}
+        for name, game in self.games.items():
+            try:
+                games[name] = {**game.status(), "settings": current(game)}
+            except Exception as e:
+                games[name] = {"error": str(e)}
+
+        body = {
+            "uptime_seconds": self._uptime(),
+            "games": games,
+            "metrics": self.registry.snapshot(),
+        }
+        return web.json_response(
+            body, dumps=functools.partial(json.dumps, default=str)
+        )
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+
+
+# Keeps a background job alive: if it raises, it is restarted after a backoff.
+# Returning normally ends supervision; cancellation is passed through.
+async def supervise(
+    name: str,
+    job_factory,
+    retry_delay: float = 5,
+    max_retry_delay: float = 300,
+    sleep=asyncio.sleep,
+):
+    delay = retry_delay
+    while True:
+        try:
+            return await job_factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"{name} failed: {e}, restarting in {delay} seconds")
+            await sleep(delay)
+            delay = min(delay * 2, max_retry_delay)
+
+
+async def cancel(task: asyncio.Task | None):
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
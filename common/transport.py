@@ -0,0 +1,126 @@
+import aiohttp
+from curl_cffi import CurlHttpVersion, CurlOpt, requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from common.warmup import DNS_CACHE, DNS_TTL
+
+# HTTP transports for the REST games (blum, tomarket), selected with
+# --transport:
+#
+#   aiohttp  aiohttp.ClientSession, HTTP/1.1: concurrent requests (balance
+#            reads next to claims) each hold a connection of their own
+#   http2    Http2Session, the same interface on curl_cffi (already used by
+#            memefi): every request is a stream multiplexed over a single
+#            HTTP/2 connection per host
+#
+# Sessions made here share the DNS cache of common.warmup.
+#
+# Http2Session only implements what the games use: `request()` as an async
+# context manager whose response has status, headers, raise_for_status(),
+# json() and text(). Errors are raised as aiohttp.ClientError, so the games'
+# error handling does not depend on the transport.
+
+TRANSPORTS = ("aiohttp", "http2")
+# concurrent streams per session; servers typically allow 100 per connection
+MAX_STREAMS = 100
+
+
+class Http2Response:
+    def __init__(self, method: str, url: str, response):
+        self.method = method
+        self.url = URL(url)
+        self.status = response.status_code
+        self.reason = response.reason
+        self.headers = CIMultiDictProxy(CIMultiDict(response.headers))
+        self._response = response
+
+    def raise_for_status(self):
+        if self.status < 400:
+            return
+        request_info = aiohttp.RequestInfo(
+            self.url, self.method, CIMultiDictProxy(CIMultiDict()), self.url
+        )
+        raise aiohttp.ClientResponseError(
+            request_info,
+            (),
+            status=self.status,
+            message=self.reason,
+            headers=self.headers,
+        )
+
+    async def json(self):
+        return self._response.json()
+
+    async def text(self) -> str:
+        return self._response.text
+
+
+class _RequestContext:
+    def __init__(self, session, method: str, url: str, kwargs: dict):
+        self._session = session
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+
+    async def __aenter__(self) -> Http2Response:
+        return await self._session._send(self._method, self._url, **self._kwargs)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class Http2Session:
+    def __init__(self, max_streams: int = MAX_STREAMS):
+        # PIPEWAIT: requests issued while the connection is being set up wait
+        # for it and become streams on it, instead of opening more connections
+        self._session = requests.AsyncSession(
+            max_clients=max_streams,
+            curl_options={CurlOpt.PIPEWAIT: 1, CurlOpt.DNS_CACHE_TIMEOUT: int(DNS_TTL)},
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        await self._session.close()
+
+    def request(self, method: str, url: str, **kwargs) -> _RequestContext:
+        return _RequestContext(self, method, url, kwargs)
+
+    async def _send(self, method: str, url: str, **kwargs) -> Http2Response:
+        # cleartext HTTP/2 (the local stand-in) needs prior knowledge, over
+        # TLS it is negotiated with ALPN
+        http_version = (
+            CurlHttpVersion.V2_PRIOR_KNOWLEDGE
+            if url.startswith("http://")
+            else CurlHttpVersion.V2TLS
+        )
+        try:
+            response = await self._session.request(
+                method, url, http_version=http_version, **kwargs
+            )
+        except requests.RequestsError as e:
+            raise aiohttp.ClientConnectionError(str(e)) from e
+        return Http2Response(method, url, response)
+
+
+def aiohttp_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(resolver=DNS_CACHE, use_dns_cache=False)
+    return aiohttp.ClientSession(connector=connector)
+
+
+def curl_session() -> requests.AsyncSession:
+    # memefi's session
+    return requests.AsyncSession(
+        curl_options={CurlOpt.DNS_CACHE_TIMEOUT: int(DNS_TTL)}
+    )
+
+
+def session_factory(transport: str):
+    if transport == "http2":
+        return Http2Session
+    return aiohttp_session
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import socket
+import time
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import ThreadedResolver
+
+# Connection warm-up.
+#
+# Every game warms its session when it starts: a HEAD request to the API
+# host resolves it and leaves a TCP / TLS connection in the session's pool.
+# Before a scheduled action (a farming claim, the daily check-in, the end of
+# the tap bot session, the end of an energy wait that may open a turbo
+# window) the job wakes WARMUP_LEAD seconds early and warms the session
+# again, so the request that matters reuses a fresh connection instead of
+# paying DNS, TCP and TLS setup at the deadline.
+#
+# DNS answers are cached for DNS_TTL seconds: CachingResolver for aiohttp,
+# CURLOPT_DNS_CACHE_TIMEOUT for curl_cffi. getaddrinfo does not report the
+# records' TTL, so the TTL is fixed; an expired entry is still answered from
+# the cache while it is refreshed in the background, a lookup only waits for
+# the resolver the first time a host is seen.
+
+DNS_TTL = 300.0
+# should stay below the pools' idle timeout (15s for aiohttp)
+WARMUP_LEAD = 5.0
+
+
+class CachingResolver(AbstractResolver):
+    def __init__(self, ttl: float = DNS_TTL):
+        self.ttl = ttl
+        self._entries: dict[tuple, tuple[float, list]] = {}
+        self._refreshing: dict[tuple, asyncio.Task] = {}
+
+    async def resolve(self, host: str, port: int = 0, family=socket.AF_INET):
+        key = (host, port, family)
+        entry = self._entries.get(key)
+        if entry is None:
+            return await self._refresh(key)
+
+        resolved_at, addresses = entry
+        if time.monotonic() - resolved_at > self.ttl and key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(self._refresh_quietly(key))
+        return addresses
+
+    async def _refresh(self, key: tuple) -> list:
+        # ThreadedResolver binds to the running loop, the cache outlives loops
+        addresses = await ThreadedResolver().resolve(*key)
+        self._entries[key] = (time.monotonic(), addresses)
+        return addresses
+
+    async def _refresh_quietly(self, key: tuple):
+        try:
+            await self._refresh(key)
+        except OSError as e:
+            logging.warning(f"DNS refresh of {key[0]} failed, keeping it: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def close(self):
+        # shared by every session; closing one must not drop the cache
+        pass
+
+
+DNS_CACHE = CachingResolver()
+
+
+async def sleep_warm(clock, seconds: float, warm=None):
+    # sleeps `seconds`, calling `warm()` WARMUP_LEAD seconds before the end
+    if warm is not None and seconds > WARMUP_LEAD:
+        deadline = clock.monotonic() + seconds
+        await clock.sleep(seconds - WARMUP_LEAD)
+        await warm()
+        seconds = deadline - clock.monotonic()
+    if seconds > 0:
+        await clock.sleep(seconds)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from common.metrics import REGISTRY
+
+
+class LoopWatchdog:
+    # A task ticks every `interval` seconds and records how late each tick
+    # woke up (the loop lag). A helper thread watches the ticks; if the loop
+    # has not ticked for `threshold` seconds something is blocking it, and the
+    # stack of the loop thread is captured while it is still stuck.
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        report_every: float = 60.0,
+        registry=REGISTRY,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_every = report_every
+        self.lag = registry.histogram("event_loop.lag_seconds")
+        self.blocked = registry.counter("event_loop.blocked_callbacks")
+        self.last_block_stack: str | None = None
+        self._registry = registry
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._monitor: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._monitor = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._monitor.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+    async def _tick(self):
+        last_report = time.monotonic()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_tick = now
+            self.lag.observe(max(now - expected, 0.0))
+
+            if now - last_report >= self.report_every:
+                last_report = now
+                lag = self.lag.snapshot()
+                logging.info(
+                    f"Event loop lag p50={lag.get('p50', 0):.4f}s p99={lag.get('p99', 0):.4f}s max={lag.get('max', 0):.4f}s, blocked callbacks: {self.blocked.value}"
+                )
+
+    def _watch(self):
+        reported_tick = None
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            stalled = time.monotonic() - last_tick - self.interval
+            if stalled < self.threshold or reported_tick == last_tick:
+                continue
+
+            # report each stall once, with the stack as it is right now
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self.blocked.inc()
+            self.last_block_stack = "".join(traceback.format_stack(frame))
+            logging.warning(
+                f"Event loop blocked for {stalled:.3f}s, loop thread stack:\n{self.last_block_stack}"
+            )
@@ -0,0 +1,58 @@
+import math
+
+from common.metrics import REGISTRY
+
+# Tap batch sizing.
+#
+# Damage over time is bound by energy regen: every point of energy that
+# regenerates is one point of damage, unless energy sits at maxEnergy and the
+# regen is lost. So the fight should never let energy reach the cap, and
+# should otherwise send as few requests as possible.
+#
+# A batch is at most `max_taps` taps, so draining a full bar takes
+# ceil(maxEnergy / (max_taps * damage_per_hit)) back to back requests, one
+# round trip each, during which energy keeps regenerating. Draining has to
+# start that much regen below maxEnergy; that level is the target energy the
+# planner fills up to before tapping.
+
+DEFAULT_RTT = 0.5
+RTT_SMOOTHING = 0.2
+
+
+class TapBatchSizer:
+    def __init__(self, max_taps: int, name: str = "memefi"):
+        self.max_taps = max_taps
+        self.rtt: float | None = None
+        self._taps = REGISTRY.histogram(f"{name}.tap_batch.taps")
+        self._capped = REGISTRY.counter(f"{name}.tap_batch.capped")
+        self._target = REGISTRY.gauge(f"{name}.tap_batch.target_energy")
+        self._rtt = REGISTRY.gauge(f"{name}.tap_batch.rtt_seconds")
+
+    def observe(self, taps: int, seconds: float):
+        self.rtt = (
+            seconds
+            if self.rtt is None
+            else self.rtt + RTT_SMOOTHING * (seconds - self.rtt)
+        )
+        self._taps.observe(taps)
+        self._rtt.set(self.rtt)
+
+    def target_energy(self, game_config: dict) -> float:
+        max_energy = game_config.get("maxEnergy")
+        regen_per_second = game_config.get("energyRechargeLevel") + 1
+        damage_per_hit = game_config.get("weaponLevel") + 1
+
+        batch_energy = max(self.max_taps, 1) * damage_per_hit
+        drain_time = math.ceil(max_energy / batch_energy) * (self.rtt or DEFAULT_RTT)
+        # if regen outpaces what the batches can spend, tap whenever possible
+        target = max(max_energy - regen_per_second * drain_time, damage_per_hit)
+        self._target.set(target)
+        return target
+
+    def next_batch(self, game_config: dict) -> int:
+        damage_per_hit = game_config.get("weaponLevel") + 1
+        taps = game_config.get("currentEnergy") // damage_per_hit
+        if taps > self.max_taps:
+            self._capped.inc()
+            taps = self.max_taps
+        return taps
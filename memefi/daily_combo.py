@@ -0,0 +1,75 @@
+import datetime
+import itertools
+import json
+import logging
+import os
+
+# Daily combo bookkeeping.
+#
+# The combos sent each day, and the one that paid out, are kept in a small
+# JSON file keyed by UTC date:
+#
+#   {"2024-09-02": {"tried": ["1111", "1112"], "winner": null}}
+#
+# so a rerun the same day skips what was already tried, and once the combo
+# is found it costs no requests at all.
+
+DIGITS = "1234"
+KEEP_DAYS = 7
+
+
+class ComboLog:
+    def __init__(self, path: str, date: datetime.date, days: dict | None = None):
+        self.path = path
+        self.date = date.isoformat()
+        self.days = days if days is not None else {}
+        today = self.days.setdefault(self.date, {"tried": [], "winner": None})
+        self.tried = set(today["tried"])
+        self.winner: str | None = today["winner"]
+
+    @classmethod
+    def load(cls, path: str, date: datetime.date):
+        try:
+            with open(path) as f:
+                days = json.load(f)
+        except FileNotFoundError:
+            days = {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read the combo log {path}: {e}")
+            days = {}
+
+        oldest = (date - datetime.timedelta(days=KEEP_DAYS)).isoformat()
+        days = {day: entry for day, entry in days.items() if day >= oldest}
+        return cls(path, date, days)
+
+    def candidates(self, length: int, digits: str = DIGITS):
+        # every combo of `length` digits not tried yet today, generated lazily
+        for combo in itertools.product(digits, repeat=length):
+            combo = "".join(combo)
+            if combo not in self.tried:
+                yield combo
+
+    def remaining(self, length: int, digits: str = DIGITS) -> int:
+        tried = sum(
+            1
+            for combo in self.tried
+            if len(combo) == length and all(digit in digits for digit in combo)
+        )
+        return len(digits) ** length - tried
+
+    def record(self, combo: str, won: bool):
+        self.tried.add(combo)
+        today = self.days[self.date]
+        today["tried"].append(combo)
+        if won:
+            self.winner = today["winner"] = combo
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.days, f)
+        os.replace(tmp, self.path)
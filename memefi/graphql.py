@@ -0,0 +1,149 @@
+# Decoding of the memefi GraphQL responses.
+#
+# Every request is a batch of one operation and comes back as
+# `[{"data": {...}, "errors": [...]}]`. `decode()` turns that into a Result
+# holding the operation's data, or a typed Error. Errors are classified from
+# their message / extensions code, and every kind maps to the recovery the
+# client applies, so expected failures (not enough energy, a stale nonce,
+# being rate limited) are handled as values instead of exceptions.
+
+NONCE_MISMATCH = "nonce_mismatch"
+INSUFFICIENT_ENERGY = "insufficient_energy"
+AUTH = "auth"
+RATE_LIMIT = "rate_limit"
+UNKNOWN = "unknown"
+
+# recovery actions
+RESYNC_NONCE = "resync_nonce"  # re-read the nonce from the game config, retry
+WAIT_FOR_ENERGY = "wait_for_energy"  # nothing to retry, let energy regenerate
+BACK_OFF = "back_off"  # sleep `retry_after` and retry
+STOP = "stop"  # the token is invalid or expired, retrying will not help
+RAISE = "raise"  # not an expected failure
+
+ACTIONS = {
+    NONCE_MISMATCH: RESYNC_NONCE,
+    INSUFFICIENT_ENERGY: WAIT_FOR_ENERGY,
+    RATE_LIMIT: BACK_OFF,
+    AUTH: STOP,
+    UNKNOWN: RAISE,
+}
+
+# extensions.code values, then whole known messages (lower case). Anything
+# else is UNKNOWN: a fragment like "token" or "energy" also shows up in
+# errors that have nothing to do with auth or energy, and those must raise.
+_CODES = {
+    "UNAUTHENTICATED": AUTH,
+    "UNAUTHORIZED": AUTH,
+    "FORBIDDEN": AUTH,
+    "TOO_MANY_REQUESTS": RATE_LIMIT,
+    "RATE_LIMITED": RATE_LIMIT,
+}
+_MESSAGES = {
+    "invalid nonce": NONCE_MISMATCH,
+    "not enough energy": INSUFFICIENT_ENERGY,
+    "unauthorized": AUTH,
+    "unauthenticated": AUTH,
+    "jwt expired": AUTH,
+    "invalid token": AUTH,
+    "too many requests": RATE_LIMIT,
+    "rate limit exceeded": RATE_LIMIT,
+}
+
+# HTTP statuses that carry one of the errors above instead of a GraphQL body
+HTTP_ERRORS = {401: "UNAUTHORIZED", 403: "FORBIDDEN", 429: "TOO_MANY_REQUESTS"}
+
+DEFAULT_RETRY_AFTER = 5.0
+
+
+def classify(message: str, code: str | None = None) -> str:
+    if code in _CODES:
+        return _CODES[code]
+    return _MESSAGES.get(message.strip().rstrip(".").lower(), UNKNOWN)
+
+
+class Error:
+    def __init__(
+        self,
+        kind: str,
+        message: str,
+        code: str | None = None,
+        retry_after: float | None = None,
+    ):
+        self.kind = kind
+        self.message = message
+        self.code = code
+        self.retry_after = retry_after
+
+    @property
+    def action(self) -> str:
+        return ACTIONS[self.kind]
+
+    @classmethod
+    def from_json(cls, error: dict):
+        message = error.get("message") or ""
+        extensions = error.get("extensions") or {}
+        code = extensions.get("code")
+        retry_after = extensions.get("retryAfter")
+        return cls(
+            classify(message, code),
+            message,
+            code,
+            float(retry_after) if retry_after is not None else None,
+        )
+
+    def __repr__(self):
+        return f"<Error {self.kind}: {self.message}>"
+
+
+class GraphQLError(Exception):
+    def __init__(self, operation: str, error: Error):
+        super().__init__(f"{operation}: {error.message}")
+        self.operation = operation
+        self.error = error
+
+
+class Result:
+    def __init__(self, operation: str, data: dict | None, errors: list[Error]):
+        self.operation = operation
+        self.data = data
+        self.errors = errors
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and self.data is not None
+
+    @property
+    def error(self) -> Error | None:
+        if self.errors:
+            return self.errors[0]
+        if self.data is None:
+            return Error(UNKNOWN, f"no data for {self.operation}")
+        return None
+
+    def unwrap(self) -> dict:
+        if not self.ok:
+            raise GraphQLError(self.operation, self.error)
+        return self.data
+
+    def __repr__(self):
+        return f"<Result {self.operation}: {self.data if self.ok else self.error}>"
+
+
+def decode(response, operation: str) -> Result:
+    # batched responses are lists, a single operation may come back bare
+    if isinstance(response, list):
+        response = response[0] if response else {}
+    if not isinstance(response, dict):
+        return Result(operation, None, [Error(UNKNOWN, f"bad response: {response!r}")])
+
+    errors = [Error.from_json(error) for error in response.get("errors") or []]
+    data = (response.get("data") or {}).get(operation)
+    return Result(operation, data, errors)
+
+
+def http_error(status: int, text: str, retry_after: str | None = None) -> list:
+    # shaped like a GraphQL error response, so it goes through decode()
+    extensions = {"code": HTTP_ERRORS[status]}
+    if retry_after and retry_after.isdigit():
+        extensions["retryAfter"] = int(retry_after)
+    return [{"data": None, "errors": [{"message": text, "extensions": extensions}]}]
@@ -0,0 +1,35 @@
+import asyncio
+
+from common.clock import SYSTEM_CLOCK
+
+
+# Owns the tap nonce. Every MutationGameProcessTapsBatch has to be sent with
+# the nonce returned by the previous one, so those calls take the chain in
+# turn (asyncio.Lock is FIFO) while every other request runs concurrently:
+#
+#     async with self.nonce_chain as nonce:
+#         ... send the batch with `nonce` ...
+#         self.nonce_chain.advance(response_nonce)
+class NonceChain:
+    def __init__(self, nonce: str, clock=SYSTEM_CLOCK):
+        self.nonce = nonce
+        self.clock = clock
+        self.updated_at: float | None = None
+        self.batches = 0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> str:
+        await self._lock.acquire()
+        return self.nonce
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._lock.release()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def advance(self, nonce: str):
+        self.nonce = nonce
+        self.updated_at = self.clock.time()
+        self.batches += 1
@@ -0,0 +1,344 @@
+import math
+
+# Boss-fight planner.
+#
+# Given a TelegramGameConfigOutput it models the fight (energy regen, tap
+# damage, turbo and recharge boosts, the remaining bosses up to the last level)
+# and compares a few boost timing policies, returning the schedule of the one
+# that clears every boss in the least wall-clock time. The game loop runs the
+# first step, fetches the new config and plans again, so the estimates only
+# have to be good enough to rank the policies.
+#
+# Model, matching how the client plays:
+# - a tap batch spends (energy // damage_per_hit) * damage_per_hit energy and
+#   deals the same amount of damage
+# - energy is filled up to `target_energy`, a bit below maxEnergy so regen is
+#   not lost while a drain is in flight (see batching.TapBatchSizer)
+# - a turbo lasts `turbo_duration` seconds, during which a batch sized to the
+#   current energy is sent every `request_interval` seconds for
+#   `turbo_multiplier` times the damage, without spending energy
+# - a recharge refills energy to maxEnergy
+# - energy regenerates energyRechargeLevel + 1 per second up to maxEnergy
+
+TAP = "tap"
+TURBO = "turbo"
+RECHARGE = "recharge"
+WAIT = "wait"
+
+DEFAULT_REQUEST_INTERVAL = 0.75
+# maxHealth of each boss level over the previous one; only the current boss's
+# health is known, the later ones are estimated with this
+BOSS_HEALTH_GROWTH = 1.6
+MAX_PLAN_STEPS = 5000
+# steps simulated to follow a cached policy choice: the next one and what
+# comes right after it (Plan.followed_by)
+PREVIEW_STEPS = 2
+# a recharge is worth maxEnergy - energy, only spend one when nearly empty
+RECHARGE_BELOW = 0.1
+
+
+class PlanStep:
+    def __init__(self, action: str, at: float, seconds: float = 0.0, damage: int = 0):
+        self.action = action
+        self.at = at
+        self.seconds = seconds
+        self.damage = damage
+
+    def __repr__(self):
+        if self.action == WAIT:
+            return f"<{self.action} {self.seconds:.1f}s @{self.at:.1f}s>"
+        return f"<{self.action} {self.damage} dmg @{self.at:.1f}s>"
+
+
+class Plan:
+    def __init__(self, policy: str, steps: list[PlanStep], total_time: float):
+        self.policy = policy
+        self.steps = steps
+        self.total_time = total_time
+
+    @property
+    def next_step(self) -> PlanStep:
+        return self.steps[0]
+
+    def followed_by(self, action: str) -> bool:
+        # whether the step after the next one is `action`
+        return len(self.steps) > 1 and self.steps[1].action == action
+
+    def count(self, action: str) -> int:
+        return sum(1 for step in self.steps if step.action == action)
+
+    def __repr__(self):
+        return (
+            f"<Plan {self.policy}: {len(self.steps)} steps, {self.total_time:.0f}s, "
+            f"{self.count(TURBO)} turbo, {self.count(RECHARGE)} recharge, next {self.next_step}>"
+        )
+
+
+class FightState:
+    def __init__(
+        self,
+        energy: float,
+        max_energy: int,
+        regen_per_second: int,
+        damage_per_hit: int,
+        remaining_health: int,
+        turbo_boosts: int,
+        recharge_boosts: int,
+        target_energy: float | None = None,
+    ):
+        self.energy = energy
+        self.max_energy = max_energy
+        # never below one hit, or waiting for it would not make a tap possible
+        self.target_energy = max(target_energy or max_energy, damage_per_hit)
+        self.regen_per_second = regen_per_second
+        self.damage_per_hit = damage_per_hit
+        self.remaining_health = remaining_health
+        self.turbo_boosts = turbo_boosts
+        self.recharge_boosts = recharge_boosts
+
+    @classmethod
+    def from_game_config(
+        cls,
+        game_config: dict,
+        max_turbo_boosts: int,
+        max_recharge_boosts: int,
+        max_boss_level: int,
+        boss_health_growth: float = BOSS_HEALTH_GROWTH,
+        target_energy: float | None = None,
+    ):
+        current_boss = game_config.get("currentBoss")
+        free_boosts = game_config.get("freeBoosts")
+        level = current_boss.get("level") or 0
+        boss_max_health = current_boss.get("maxHealth") or 0
+
+        # health of the bosses after the current one is not known upfront,
+        # estimate it from the current boss
+        remaining_health = current_boss.get("currentHealth") or 0
+        for i in range(1, max_boss_level - level + 1):
+            remaining_health += int(boss_max_health * boss_health_growth**i)
+
+        return cls(
+            energy=game_config.get("currentEnergy"),
+            max_energy=game_config.get("maxEnergy"),
+            regen_per_second=game_config.get("energyRechargeLevel") + 1,
+            damage_per_hit=game_config.get("weaponLevel") + 1,
+            remaining_health=remaining_health,
+            turbo_boosts=max(
+                min(free_boosts.get("currentTurboAmount") or 0, max_turbo_boosts), 0
+            ),
+            recharge_boosts=max(
+                min(
+                    free_boosts.get("currentRefillEnergyAmount") or 0,
+                    max_recharge_boosts,
+                ),
+                0,
+            ),
+            target_energy=target_energy,
+        )
+
+    def copy(self):
+        return FightState(
+            self.energy,
+            self.max_energy,
+            self.regen_per_second,
+            self.damage_per_hit,
+            self.remaining_health,
+            self.turbo_boosts,
+            self.recharge_boosts,
+            self.target_energy,
+        )
+
+    @property
+    def usable_energy(self) -> int:
+        return int(self.energy // self.damage_per_hit) * self.damage_per_hit
+
+    @property
+    def is_full(self) -> bool:
+        # a tap needs at least one hit's worth of energy
+        return (
+            self.usable_energy > 0
+            and self.energy + self.damage_per_hit > self.target_energy
+        )
+
+    def time_to_energy(self, energy: float) -> float:
+        energy = min(energy, self.max_energy)
+        return max(energy - self.energy, 0) / self.regen_per_second
+
+
+# Policies return (action, seconds). `seconds` is only used for WAIT.
+
+
+def greedy_policy(state: FightState, turbo_damage) -> tuple[str, float]:
+    # what the client used to do: fire boosts as soon as they are available,
+    # otherwise dump all energy and sleep until it is full again
+    if state.turbo_boosts and state.usable_energy:
+        return TURBO, 0
+    if state.is_full or state.usable_energy >= state.remaining_health:
+        return TAP, 0
+    if state.recharge_boosts:
+        return RECHARGE, 0
+    return WAIT, max(
+        state.time_to_energy(state.target_energy), 1 / state.regen_per_second
+    )
+
+
+def _finish_or_fill(state: FightState) -> tuple[str, float]:
+    # no turbo left: dump energy when full (or when it is enough to finish),
+    # refill with a recharge right after a dump
+    if state.usable_energy >= state.remaining_health or state.is_full:
+        return TAP, 0
+    if state.recharge_boosts and state.energy < state.max_energy * RECHARGE_BELOW:
+        return RECHARGE, 0
+    target = min(state.target_energy, state.remaining_health + state.damage_per_hit)
+    return WAIT, max(state.time_to_energy(target), 1 / state.regen_per_second)
+
+
+def full_energy_turbo_policy(state: FightState, turbo_damage) -> tuple[str, float]:
+    # turbo damage scales with the energy it is fired at, and turbo taps do
+    # not spend energy: save up to full and chain the turbos back to back
+    if state.usable_energy >= state.remaining_health:
+        return TAP, 0
+    if state.turbo_boosts:
+        if state.is_full or turbo_damage(state) >= state.remaining_health:
+            return TURBO, 0
+        return WAIT, max(
+            state.time_to_energy(state.target_energy), 1 / state.regen_per_second
+        )
+    return _finish_or_fill(state)
+
+
+def recharge_turbo_policy(state: FightState, turbo_damage) -> tuple[str, float]:
+    # like full_energy_turbo_policy, but spend recharges to fill up before a
+    # turbo instead of waiting for regen
+    if (
+        state.turbo_boosts
+        and state.recharge_boosts
+        and not state.is_full
+        and turbo_damage(state) < state.remaining_health
+    ):
+        return RECHARGE, 0
+    return full_energy_turbo_policy(state, turbo_damage)
+
+
+POLICIES = {
+    "greedy": greedy_policy,
+    "full_energy_turbo": full_energy_turbo_policy,
+    "recharge_turbo": recharge_turbo_policy,
+}
+
+
+def simulate(
+    state: FightState,
+    policy,
+    turbo_multiplier: int,
+    turbo_duration: float,
+    request_interval: float = DEFAULT_REQUEST_INTERVAL,
+    max_steps: int = MAX_PLAN_STEPS,
+) -> tuple[list[PlanStep], float]:
+    state = state.copy()
+    requests_per_turbo = max(int(turbo_duration / request_interval), 1)
+
+    def turbo_damage(s: FightState) -> int:
+        return turbo_multiplier * s.usable_energy * requests_per_turbo
+
+    def regen(seconds: float):
+        state.energy = min(
+            state.energy + state.regen_per_second * seconds, state.max_energy
+        )
+
+    steps = []
+    now = 0.0
+    while state.remaining_health > 0 and len(steps) < max_steps:
+        if steps and not state.turbo_boosts and not state.recharge_boosts:
+            # no boosts left to time, the rest is bound by energy regen
+            seconds = (
+                max(state.remaining_health - state.energy, 0) / state.regen_per_second
+            )
+            steps.append(PlanStep(TAP, now, seconds, state.remaining_health))
+            state.remaining_health = 0
+            now += seconds
+            break
+
+        action, seconds = policy(state, turbo_damage)
+        if action == TAP:
+            damage = min(state.usable_energy, state.remaining_health)
+            state.energy -= state.usable_energy
+            seconds = request_interval
+        elif action == TURBO:
+            damage = min(turbo_damage(state), state.remaining_health)
+            state.turbo_boosts -= 1
+            seconds = turbo_duration
+        elif action == RECHARGE:
+            damage = 0
+            state.energy = state.max_energy
+            state.recharge_boosts -= 1
+            seconds = request_interval
+        else:
+            damage = 0
+
+        steps.append(PlanStep(action, now, seconds, damage))
+        state.remaining_health -= damage
+        regen(seconds)
+        now += seconds
+
+    if state.remaining_health > 0:
+        now = math.inf
+    return steps, now
+
+
+def plan_boss_fight(
+    game_config: dict,
+    max_turbo_boosts: int,
+    max_recharge_boosts: int,
+    turbo_multiplier: int,
+    turbo_duration: float,
+    max_boss_level: int,
+    request_interval: float = DEFAULT_REQUEST_INTERVAL,
+    boss_health_growth: float = BOSS_HEALTH_GROWTH,
+    target_energy: float | None = None,
+    cache: dict | None = None,
+) -> Plan:
+    # Simulating every policy to the end is too slow to redo on the event
+    # loop before every tap batch. The ranking only changes with the boost
+    # inventory or the boss, so with a `cache` (a dict owned by the caller)
+    # the chosen policy is kept per (turbo boosts, recharge boosts, boss
+    # level) and only its next PREVIEW_STEPS steps are simulated.
+    state = FightState.from_game_config(
+        game_config,
+        max_turbo_boosts,
+        max_recharge_boosts,
+        max_boss_level,
+        boss_health_growth,
+        target_energy,
+    )
+
+    key = (
+        state.turbo_boosts,
+        state.recharge_boosts,
+        game_config.get("currentBoss").get("level"),
+        boss_health_growth,
+    )
+    if cache is not None and key in cache:
+        name, total_time = cache[key]
+        steps, _ = simulate(
+            state,
+            POLICIES[name],
+            turbo_multiplier,
+            turbo_duration,
+            request_interval,
+            max_steps=PREVIEW_STEPS,
+        )
+        return Plan(name, steps or [PlanStep(WAIT, 0.0)], total_time)
+
+    best = None
+    for name, policy in POLICIES.items():
+        steps, total_time = simulate(
+            state, policy, turbo_multiplier, turbo_duration, request_interval
+        )
+        if not steps:
+            steps = [PlanStep(WAIT, 0.0)]
+        if best is None or total_time < best.total_time:
+            best = Plan(name, steps, total_time)
+    if cache is not None:
+        cache[key] = (best.policy, best.total_time)
+    return best
@@ -0,0 +1,369 @@
+import argparse
+import inspect
+import itertools
+import time
+
+from memefi import (
+    MAX_BOSS_LEVEL,
+    MAX_TAPS_COUNT,
+    TURBO_BOOST_DAMAGE_MULTIPLIER,
+    TURBO_BOOST_DURATION,
+    planner,
+)
+from memefi.batching import TapBatchSizer
+
+# Offline simulator of the memefi boss fight.
+#
+# Runs the planner policies MemefiGame plays with on a virtual clock: energy
+# regenerates, taps and turbo batches damage the bosses, free boosts reset
+# daily and the tap bot deals damage in the background while it is running.
+# Nothing sleeps, so days of play take milliseconds and whole parameter grids
+# can be swept from the command line:
+#
+#   python -m memefi.simulator --hours 72 --sweep energy_recharge_level=1,3,5 --sweep turbo_boosts_per_day=3,6
+
+DAY = 24 * 60 * 60
+
+
+# The defaults start the fight on a part-filled energy bar, where firing the
+# boosts right away (greedy) and saving up for them diverge; on a full bar
+# every policy opens with the same turbos and the rows come out identical.
+
+
+class SimulationConfig:
+    def __init__(
+        self,
+        max_energy: int = 1500,
+        start_energy: int = 300,
+        energy_recharge_level: int = 2,
+        weapon_level: int = 2,
+        start_boss_level: int = 1,
+        max_boss_level: int = MAX_BOSS_LEVEL,
+        base_boss_health: int = 25000,
+        boss_health_growth: float = planner.BOSS_HEALTH_GROWTH,
+        turbo_multiplier: int = TURBO_BOOST_DAMAGE_MULTIPLIER,
+        turbo_duration: float = TURBO_BOOST_DURATION,
+        turbo_boosts_per_day: int = 3,
+        recharge_boosts_per_day: int = 3,
+        max_taps: int = MAX_TAPS_COUNT,
+        request_interval: float = planner.DEFAULT_REQUEST_INTERVAL,
+        tap_bot_damage_per_sec: float = 0,
+        tap_bot_duration: float = 3 * 60 * 60,
+        tap_bot_attempts_per_day: int = 3,
+    ):
+        self.max_energy = max_energy
+        self.start_energy = start_energy
+        self.energy_recharge_level = energy_recharge_level
+        self.weapon_level = weapon_level
+        self.start_boss_level = start_boss_level
+        self.max_boss_level = max_boss_level
+        self.base_boss_health = base_boss_health
+        self.boss_health_growth = boss_health_growth
+        self.turbo_multiplier = turbo_multiplier
+        self.turbo_duration = turbo_duration
+        self.turbo_boosts_per_day = turbo_boosts_per_day
+        self.recharge_boosts_per_day = recharge_boosts_per_day
+        self.max_taps = max_taps
+        self.request_interval = request_interval
+        self.tap_bot_damage_per_sec = tap_bot_damage_per_sec
+        self.tap_bot_duration = tap_bot_duration
+        self.tap_bot_attempts_per_day = tap_bot_attempts_per_day
+
+    def boss_health(self, level: int) -> int:
+        return int(self.base_boss_health * self.boss_health_growth ** (level - 1))
+
+    def replace(self, **overrides):
+        values = dict(vars(self))
+        values.update(overrides)
+        return SimulationConfig(**values)
+
+
+class SimulationResult:
+    def __init__(self, strategy: str, config: SimulationConfig):
+        self.strategy = strategy
+        self.config = config
+        self.elapsed = 0.0
+        self.damage = 0
+        self.tap_bot_damage = 0
+        self.requests = 0
+        self.turbo_used = 0
+        self.recharge_used = 0
+        self.time_to_level: dict[int, float] = {}
+        self.cleared = False
+
+    @property
+    def damage_per_hour(self) -> float:
+        return self.damage / (self.elapsed / 3600) if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (
+            f"<SimulationResult {self.strategy}: {self.damage_per_hour:.0f} dmg/h, "
+            f"level {max(self.time_to_level, default=self.config.start_boss_level)} "
+            f"in {self.elapsed / 3600:.1f}h, {self.requests} requests>"
+        )
+
+
+class Simulation:
+    def __init__(self, config: SimulationConfig, strategy: str):
+        self.config = config
+        self.strategy = strategy
+        self.result = SimulationResult(strategy, config)
+
+        self.now = 0.0
+        self.boss_level = config.start_boss_level
+        self.boss_health = config.boss_health(self.boss_level)
+        self.state = planner.FightState(
+            energy=min(config.start_energy, config.max_energy),
+            max_energy=config.max_energy,
+            regen_per_second=config.energy_recharge_level + 1,
+            damage_per_hit=config.weapon_level + 1,
+            remaining_health=0,
+            turbo_boosts=config.turbo_boosts_per_day,
+            recharge_boosts=config.recharge_boosts_per_day,
+        )
+        self.day = 0
+        self.tap_bot_attempts = config.tap_bot_attempts_per_day
+        self.tap_bot_ends_at = None
+        self.requests_per_turbo = max(
+            int(config.turbo_duration / config.request_interval), 1
+        )
+        # the "planner" strategy plans like MemefiGame.plan_boss_fight
+        self.batch_sizer = TapBatchSizer(config.max_taps, name="simulator")
+        self.plan_cache = {}
+        self._update_remaining_health()
+        self._start_tap_bot()
+
+    @property
+    def finished(self) -> bool:
+        return self.boss_level >= self.config.max_boss_level and self.boss_health <= 0
+
+    def _update_remaining_health(self):
+        self.state.remaining_health = max(self.boss_health, 0) + sum(
+            self.config.boss_health(level)
+            for level in range(self.boss_level + 1, self.config.max_boss_level + 1)
+        )
+
+    def _turbo_damage(self, state: planner.FightState) -> int:
+        return self.config.turbo_multiplier * state.usable_energy * self.requests_per_turbo
+
+    def _deal_damage(self, damage: float) -> float:
+        dealt = min(damage, self.boss_health)
+        self.boss_health -= dealt
+        self.result.damage += dealt
+        if self.boss_health <= 0 and self.boss_level < self.config.max_boss_level:
+            self.boss_level += 1
+            self.boss_health = self.config.boss_health(self.boss_level)
+            self.result.time_to_level[self.boss_level] = self.now
+            self.result.requests += 1  # telegramGameSetNextBoss
+        self._update_remaining_health()
+        return dealt
+
+    def _start_tap_bot(self):
+        if not self.config.tap_bot_damage_per_sec or self.tap_bot_attempts <= 0:
+            self.tap_bot_ends_at = None
+            return
+        self.tap_bot_attempts -= 1
+        self.tap_bot_ends_at = self.now + self.config.tap_bot_duration
+        self.result.requests += 1  # TapbotStart
+
+    def _advance(self, seconds: float):
+        end = self.now + seconds
+        while self.now < end and not self.finished:
+            # next event inside this interval: a new day or the tap bot ending
+            next_day = (self.day + 1) * DAY
+            step_end = min(end, next_day)
+            if self.tap_bot_ends_at is not None:
+                step_end = min(step_end, self.tap_bot_ends_at)
+
+            elapsed = step_end - self.now
+            self.state.energy = min(
+                self.state.energy + self.state.regen_per_second * elapsed,
+                self.state.max_energy,
+            )
+            if self.tap_bot_ends_at is not None:
+                damage = self.config.tap_bot_damage_per_sec * elapsed
+                while damage > 0 and not self.finished:
+                    dealt = self._deal_damage(damage)
+                    self.result.tap_bot_damage += dealt
+                    damage -= dealt
+            self.now = step_end
+
+            if self.tap_bot_ends_at is not None and self.now >= self.tap_bot_ends_at:
+                self.result.requests += 1  # TapbotClaim
+                self._start_tap_bot()
+            if self.now >= next_day:
+                self.day += 1
+                self.state.turbo_boosts = self.config.turbo_boosts_per_day
+                self.state.recharge_boosts = self.config.recharge_boosts_per_day
+                self.tap_bot_attempts = self.config.tap_bot_attempts_per_day
+                if self.tap_bot_ends_at is None:
+                    self._start_tap_bot()
+
+    def _game_config(self) -> dict:
+        # the parts of TelegramGameConfigOutput the planner reads
+        return {
+            "currentEnergy": int(self.state.energy),
+            "maxEnergy": self.state.max_energy,
+            "energyRechargeLevel": self.config.energy_recharge_level,
+            "weaponLevel": self.config.weapon_level,
+            "currentBoss": {
+                "level": self.boss_level,
+                "currentHealth": max(int(self.boss_health), 0),
+                "maxHealth": self.config.boss_health(self.boss_level),
+            },
+            "freeBoosts": {
+                "currentTurboAmount": self.state.turbo_boosts,
+                "currentRefillEnergyAmount": self.state.recharge_boosts,
+            },
+        }
+
+    def _decide(self) -> tuple[str, float]:
+        if self.strategy != "planner":
+            return planner.POLICIES[self.strategy](self.state, self._turbo_damage)
+
+        # the same call as MemefiGame.plan_boss_fight, with every free boost
+        # allowed
+        game_config = self._game_config()
+        plan = planner.plan_boss_fight(
+            game_config,
+            self.config.turbo_boosts_per_day,
+            self.config.recharge_boosts_per_day,
+            turbo_multiplier=self.config.turbo_multiplier,
+            turbo_duration=self.config.turbo_duration,
+            max_boss_level=self.config.max_boss_level,
+            request_interval=self.config.request_interval,
+            boss_health_growth=self.config.boss_health_growth,
+            target_energy=self.batch_sizer.target_energy(game_config),
+            cache=self.plan_cache,
+        )
+        return plan.next_step.action, plan.next_step.seconds
+
+    def _tap(self) -> int:
+        # one request drains at most max_taps hits, like TapBatchSizer.next_batch
+        taps = min(
+            self.state.usable_energy // self.state.damage_per_hit, self.config.max_taps
+        )
+        self.batch_sizer.observe(taps, self.config.request_interval)
+        return taps * self.state.damage_per_hit
+
+    def run(self, hours: float) -> SimulationResult:
+        horizon = hours * 3600
+        interval = self.config.request_interval
+        while self.now < horizon and not self.finished:
+            action, seconds = self._decide()
+            if action == planner.TAP:
+                spent = self._tap()
+                self.state.energy -= spent
+                self._deal_damage(spent)
+                self.result.requests += 1
+                self._advance(interval)
+            elif action == planner.TURBO:
+                self.state.turbo_boosts -= 1
+                self.result.turbo_used += 1
+                self.result.requests += 1
+                for _ in range(self.requests_per_turbo):
+                    if self.finished:
+                        break
+                    self._deal_damage(
+                        self.config.turbo_multiplier * self.state.usable_energy
+                    )
+                    self.result.requests += 1
+                    self._advance(interval)
+            elif action == planner.RECHARGE:
+                self.state.energy = self.state.max_energy
+                self.state.recharge_boosts -= 1
+                self.result.recharge_used += 1
+                self.result.requests += 1
+                self._advance(interval)
+            else:
+                self._advance(max(min(seconds, horizon - self.now), interval))
+
+        self.result.elapsed = min(self.now, horizon) if self.now else 0.0
+        self.result.cleared = self.finished
+        return self.result
+
+
+STRATEGIES = list(planner.POLICIES) + ["planner"]
+
+
+def run_simulation(
+    config: SimulationConfig, strategy: str, hours: float
+) -> SimulationResult:
+    return Simulation(config, strategy).run(hours)
+
+
+def sweep(
+    base: SimulationConfig,
+    grid: dict[str, list],
+    strategies: list[str] = STRATEGIES,
+    hours: float = 24,
+) -> list[SimulationResult]:
+    results = []
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = base.replace(**dict(zip(names, values)))
+        for strategy in strategies:
+            results.append(run_simulation(config, strategy, hours))
+    return results
+
+
+def _parse_sweep(values: list[str]) -> dict[str, list]:
+    # the annotations, not the defaults: `tap_bot_damage_per_sec: float = 0`
+    kinds = inspect.get_annotations(SimulationConfig.__init__)
+    grid = {}
+    for value in values:
+        name, _, options = value.partition("=")
+        if name not in kinds or name == "return":
+            raise SystemExit(f"Unknown simulation parameter: {name}")
+        kind = kinds[name]
+        try:
+            grid[name] = [kind(option) for option in options.split(",")]
+        except ValueError as e:
+            raise SystemExit(f"Invalid {name} ({kind.__name__}): {e}")
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="memefi.simulator")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument(
+        "--strategy", action="append", choices=STRATEGIES, help="default: all"
+    )
+    parser.add_argument(
+        "--sweep",
+        action="append",
+        default=[],
+        metavar="PARAM=V1,V2",
+        help="sweep a SimulationConfig parameter, can be repeated",
+    )
+    args = parser.parse_args()
+
+    grid = _parse_sweep(args.sweep)
+    started = time.perf_counter()
+    results = sweep(SimulationConfig(), grid, args.strategy or STRATEGIES, args.hours)
+    wall = time.perf_counter() - started
+
+    simulated = 0.0
+    for result in results:
+        params = " ".join(f"{name}={getattr(result.config, name)}" for name in grid)
+        reached = max(result.time_to_level, default=result.config.start_boss_level)
+        time_to_level = (
+            f"{result.time_to_level[reached] / 3600:.2f}h"
+            if reached in result.time_to_level
+            else "-"
+        )
+        print(
+            f"{params:<40} {result.strategy:<18} "
+            f"{result.damage_per_hour:>12.0f} dmg/h  level {reached:>2} at {time_to_level:>8}"
+            f"  turbo {result.turbo_used:>3}  recharge {result.recharge_used:>3}"
+            f"  requests {result.requests:>6}{'  cleared' if result.cleared else ''}"
+        )
+        simulated += result.elapsed
+    print(
+        f"{len(results)} runs, {simulated / 3600:.0f}h simulated in {wall:.3f}s "
+        f"({simulated / max(wall, 1e-9):.0f}x real time)"
+    )
+
+
+if __name__ == "__main__":
+    main()
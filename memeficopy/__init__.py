@@ -2,27 +2,83 @@ import secrets
 import asyncio
 import logging
 import random
-import itertools
-import datetime
+import os
+import collections
 
 from curl_cffi import requests
 import platform
 
+from common import profiling, runtime, tasks, transport
+from common.cli import parse_args
+from common.clock import SYSTEM_CLOCK, ServerClock, parse_iso8601
+from common.ledger import LEDGER
+from common.shutdown import DRAIN
+from common.state import STATE_DIR
+from common.metrics import REGISTRY
+from common.scheduler import Scheduler
+from common.singleflight import SingleFlight
+from common.status import clock_status, deadline_status, scheduler_status
+from memefi import daily_combo, graphql
+from memefi.batching import TapBatchSizer
+from memefi.nonce import NonceChain
+from memefi import planner
+
+GRAPHQL_URL = "https://api-gw-tg.memefi.club/graphql"
 DEFAULT_NONCE = secrets.token_hex(32)
 MAX_TAPS_COUNT = 1000
+MAX_GRAPHQL_RETRIES = 3
 TURBO_BOOST_DAMAGE_MULTIPLIER = 10
 TURBO_BOOST_DURATION = TURBO_BOOST_DAMAGE_MULTIPLIER
+# pause between tap batches while a turbo boost is active
+TURBO_REQUEST_INTERVAL = 0.5
 
 COMBO_SEQUENCE_LENGTH = 4
 
 MAX_BOSS_LEVEL = 15
 
-DEFAULT_SPIN_COUNT = 10 
+# under --state-dir
+COMBO_LOG_FILE = "memefi_daily_combo.json"
+
+# largest batch the slot machine accepts in a single spinSlotMachine request
+MAX_SPIN_COUNT = 150
+# never poll faster than this when the server reports a recharge time in the past
+MIN_SPIN_RECHARGE_WAIT = 5
+# a recharge that is due keeps being polled, backing off up to this; past it
+# without new energy, spinning stops
+MAX_SPIN_RECHARGE_WAIT = 600
 
 logging.basicConfig(level=logging.INFO)
 
 
+class SpinStats:
+    def __init__(self):
+        self.requests = 0
+        self.spins = 0
+        self.rewards = collections.Counter()
+
+    def add(self, spin_result: dict):
+        spin_results = spin_result.get("spinResults") or []
+        self.requests += 1
+        self.spins += spin_result.get("spinsProcessedCount") or len(spin_results)
+        for result in spin_results:
+            self.rewards[result.get("rewardType")] += result.get("rewardAmount") or 0
+
+    def __str__(self):
+        rewards = ", ".join(f"{k}={v}" for k, v in self.rewards.items()) or "none"
+        return f"{self.spins} spins in {self.requests} requests, rewards: {rewards}"
+
+
 class MemefiGame:
+    # live settings, see common.settings
+    SETTINGS = {
+        "max_allowed_turbo_boosts": int,
+        "max_allowed_recharge_boosts": int,
+        "tap_bot": bool,
+        "allow_spin": bool,
+        "turbo_request_interval": float,
+        "boss_health_growth": float,
+    }
+
     def __init__(
         self,
         jwt_token: str,
@@ -30,45 +86,138 @@ class MemefiGame:
         max_allowed_turbo_boosts: int = 0,
         max_allowed_recharge_boosts: int = 0,
         tap_bot: bool = False,
-        allow_spin: bool = False
+        allow_spin: bool = False,
+        clock=SYSTEM_CLOCK,
+        session_factory=requests.AsyncSession,
+        url: str = GRAPHQL_URL,
+        combo_log_path: str = os.path.join(STATE_DIR, COMBO_LOG_FILE),
     ):
         self.jwt_token = jwt_token
-        self.url = "https://api-gw-tg.memefi.club/graphql"
+        self.session_factory = session_factory
+        self.url = url
+        self.combo_log_path = combo_log_path
         self.headers = {
             "Authorization": f"Bearer {self.jwt_token}",
             "Content-Type": "application/json",
             # "Accept": "*/*",
             # "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.93 Safari/537.36",
         }
-        self.nonce = initial_nonce if initial_nonce else DEFAULT_NONCE
+        self.nonce_chain = NonceChain(
+            initial_nonce if initial_nonce else DEFAULT_NONCE, clock
+        )
         self.max_allowed_turbo_boosts = max_allowed_turbo_boosts
         self.max_allowed_recharge_boosts = max_allowed_recharge_boosts
         self.tap_bot = tap_bot
+        self.tap_bot_config = None
+        self.turbo_request_interval = TURBO_REQUEST_INTERVAL
+        # how much tougher each boss is than the last, for the planner
+        self.boss_health_growth = planner.BOSS_HEALTH_GROWTH
+        # last game config seen, for the status endpoint
+        self.game_config = None
+        # coins in that config, and the booster the current taps spend, for
+        # the ledger
+        self._coins: int | None = None
+        self.booster = ""
+        self.clock = ServerClock("memefi", clock)
+        self.scheduler = Scheduler(self.clock)
+        self.single_flight = SingleFlight("memefi")
+        self.batch_sizer = TapBatchSizer(MAX_TAPS_COUNT)
+        # policy choices of plan_boss_fight, see planner.plan_boss_fight
+        self.plan_cache = {}
         self.allow_spin = allow_spin
+        self.spin_stats = SpinStats()
 
         if self.max_allowed_turbo_boosts < 0:
             raise ValueError("Max allowed turbo boosts must be a positive integer")
 
+    @property
+    def nonce(self) -> str:
+        return self.nonce_chain.nonce
+
+    def _observe_game_config(self, game_config: dict, source: str | None = None):
+        # coin changes go to the ledger under the step that returned them;
+        # without a source the coins were accounted for elsewhere (spins)
+        coins = game_config.get("coinsAmount")
+        if source and coins is not None and self._coins is not None:
+            if coins != self._coins:
+                LEDGER.record("memefi", source, coins - self._coins, self.booster)
+        if coins is not None:
+            self._coins = coins
+        self.game_config = game_config
+
     async def _request(
         self, session: requests.AsyncSession, method: str, payload: dict | list
     ):
+        REGISTRY.counter("memefi.requests").inc()
+        sent_at = self.clock.time()
         try:
-            response = await session.request(
-                method,
-                self.url,
-                headers=self.headers,
-                json=payload,
-                impersonate="chrome",
+            async with DRAIN.request():
+                response = await session.request(
+                    method,
+                    self.url,
+                    headers=self.headers,
+                    json=payload,
+                    impersonate="chrome",
+                )
+            received_at = self.clock.time()
+            REGISTRY.histogram("memefi.request_seconds").observe(received_at - sent_at)
+            self.clock.observe_date_header(
+                response.headers.get("Date"), sent_at, received_at
             )
+            if response.status_code in graphql.HTTP_ERRORS:
+                REGISTRY.counter("memefi.request_errors").inc()
+                return graphql.http_error(
+                    response.status_code,
+                    response.text,
+                    response.headers.get("Retry-After"),
+                )
             response.raise_for_status()
             return response.json()
         except requests.RequestsError as e:
+            REGISTRY.counter("memefi.request_errors").inc()
             logging.error(f"Request failed: {e}")
             raise
 
+    async def warm_up(self, session: requests.AsyncSession):
+        # resolves the host and leaves an open connection in the session's
+        # pool ahead of the requests that matter (see common.warmup); the
+        # response itself does not matter
+        started = self.clock.monotonic()
+        try:
+            await session.request("HEAD", self.url, impersonate="chrome")
+        except requests.RequestsError as e:
+            logging.warning(f"Warm-up failed: {e}")
+            return
+        REGISTRY.histogram("memefi.warmup_seconds").observe(
+            self.clock.monotonic() - started
+        )
+
+    async def _query(
+        self, session: requests.AsyncSession, payload: list, operation: str
+    ) -> graphql.Result:
+        # sends a single operation, backing off and retrying while rate limited
+        attempt = 0
+        while True:
+            response = await self._request(session, "POST", payload)
+            result = graphql.decode(response, operation)
+            error = result.error
+            if error is None:
+                return result
+
+            REGISTRY.counter(f"memefi.graphql_errors.{error.kind}").inc()
+            attempt += 1
+            if error.action != graphql.BACK_OFF or attempt >= MAX_GRAPHQL_RETRIES:
+                return result
+            delay = error.retry_after or (
+                graphql.DEFAULT_RETRY_AFTER * 2 ** (attempt - 1)
+            )
+            logging.warning(f"{operation} rate limited, retrying in {delay} seconds")
+            await self.clock.sleep(delay)
+
     def generate_vector(self, taps_count: int) -> str:
-        vector = [random.randint(1, 4) for _ in range(taps_count)]
-        return ",".join(map(str, vector))
+        # one call for the whole batch instead of a randint per tap, which
+        # was most of a batch's client CPU; the same uniform 1-4 digits
+        return ",".join(random.choices("1234", k=taps_count))
 
     async def get_game_config(self, session: requests.AsyncSession):
         payload = [
@@ -79,8 +228,12 @@ class MemefiGame:
             }
         ]
 
-        result = await self._request(session, "POST", payload)
-        return result[0]["data"]["telegramGameGetConfig"]
+        result = await self.single_flight.do(
+            ("game_config", session),
+            lambda: self._query(session, payload, "telegramGameGetConfig"),
+        )
+        self._observe_game_config(result.unwrap(), "other")
+        return self.game_config
 
     async def get_tap_bot_config(self, session: requests.AsyncSession):
         payload = [
@@ -91,7 +244,10 @@ class MemefiGame:
             }
         ]
 
-        result = await self._request(session, "POST", payload)
+        result = await self.single_flight.do(
+            ("tap_bot_config", session),
+            lambda: self._query(session, payload, "telegramGameTapbotGetConfig"),
+        )
         #  "telegramGameTapbotGetConfig": {
         #         "damagePerSec": 24,
         #         "endsAt": "2024-09-02T17:57:27.000Z", // or null
@@ -102,7 +258,7 @@ class MemefiGame:
         #         "usedAttempts": 2,
         #         "__typename": "TelegramGameTapbotOutput"
         #     }
-        return result[0]["data"]["telegramGameTapbotGetConfig"]
+        return result.unwrap()
 
     async def start_tap_bot(self, session: requests.AsyncSession):
         payload = [
@@ -112,8 +268,8 @@ class MemefiGame:
                 "query": "fragment FragmentTapBotConfig on TelegramGameTapbotOutput {\n  damagePerSec\n  endsAt\n  id\n  isPurchased\n  startsAt\n  totalAttempts\n  usedAttempts\n  __typename\n}\n\nmutation TapbotStart {\n  telegramGameTapbotStart {\n    ...FragmentTapBotConfig\n    __typename\n  }\n}",
             }
         ]
-        result = await self._request(session, "POST", payload)
-        return result[0]["data"]["telegramGameTapbotStart"]
+        result = await self._query(session, payload, "telegramGameTapbotStart")
+        return result.unwrap()
 
     async def claim_tap_bot(self, session: requests.AsyncSession):
         payload = [
@@ -123,19 +279,16 @@ class MemefiGame:
                 "query": "fragment FragmentTapBotConfig on TelegramGameTapbotOutput {\n  damagePerSec\n  endsAt\n  id\n  isPurchased\n  startsAt\n  totalAttempts\n  usedAttempts\n  __typename\n}\n\nmutation TapbotClaim {\n  telegramGameTapbotClaimCoins {\n    ...FragmentTapBotConfig\n    __typename\n  }\n}",
             }
         ]
-        result = await self._request(session, "POST", payload)
-        return result[0]["data"]["telegramGameTapbotClaimCoins"]
+        result = await self._query(session, payload, "telegramGameTapbotClaimCoins")
+        return result.unwrap()
 
-    async def process_taps(
-        self, session: requests.AsyncSession, taps_count: int, combo: list | None = None
-    ):
-        vector = ",".join(combo) if combo else self.generate_vector(taps_count)
-        payload = [
+    def _taps_batch_payload(self, nonce: str, taps_count: int, vector: str):
+        return [
             {
                 "operationName": "MutationGameProcessTapsBatch",
                 "variables": {
                     "payload": {
-                        "nonce": self.nonce,
+                        "nonce": nonce,
                         "tapsCount": taps_count,
                         "vector": vector,
                     }
@@ -190,16 +343,40 @@ class MemefiGame:
             }
         ]
 
-        result = await self._request(session, "POST", payload)
+    async def _resync_nonce(self, session: requests.AsyncSession) -> str:
+        # the game config carries the nonce the server expects next
+        game_config = await self.get_game_config(session)
+        self.nonce_chain.advance(game_config.get("nonce"))
+        logging.info("Nonce out of sync, resynced it from the game config")
+        return self.nonce_chain.nonce
 
-        if result[0].get("errors"):
-            raise Exception(result[0]["errors"][0]["message"])
+    async def process_taps(
+        self, session: requests.AsyncSession, taps_count: int, combo: str | None = None
+    ) -> graphql.Result:
+        # Returns the result rather than the config: a batch rejected for lack
+        # of energy is expected and comes back as a failed result. A stale
+        # nonce is resynced and the batch resent; anything else raises.
+        vector = ",".join(combo) if combo else self.generate_vector(taps_count)
 
-        # print("Result is=> ", result)
-        self.nonce = result[0]["data"]["telegramGameProcessTapsBatch"][
-            "nonce"
-        ]  # Update nonce for the next request
-        return result[0]["data"]["telegramGameProcessTapsBatch"]
+        # taps batches are chained by nonce, only one can be in flight
+        async with self.nonce_chain as nonce:
+            for _ in range(MAX_GRAPHQL_RETRIES):
+                payload = self._taps_batch_payload(nonce, taps_count, vector)
+                result = await self._query(
+                    session, payload, "telegramGameProcessTapsBatch"
+                )
+                if result.ok:
+                    # Update nonce for the next request
+                    self.nonce_chain.advance(result.data["nonce"])
+                    self._observe_game_config(result.data, "taps")
+                    break
+                if result.error.action != graphql.RESYNC_NONCE:
+                    break
+                nonce = await self._resync_nonce(session)
+
+        if not result.ok and result.error.action != graphql.WAIT_FOR_ENERGY:
+            raise graphql.GraphQLError(result.operation, result.error)
+        return result
 
     async def spin_slot_machine(self, session: requests.AsyncSession, spin_count: int):
         # FIXME: Remove this, Any spin number is valid 
@@ -213,9 +390,8 @@ class MemefiGame:
                 "query": "fragment FragmentBossFightConfig on TelegramGameConfigOutput {\n    _id\n    coinsAmount\n    currentEnergy\n    maxEnergy\n    weaponLevel\n    zonesCount\n    tapsReward\n    energyLimitLevel\n    energyRechargeLevel\n    tapBotLevel\n    currentBoss {\n      _id\n      level\n      currentHealth\n      maxHealth\n    }\n    freeBoosts {\n      _id\n      currentTurboAmount\n      maxTurboAmount\n      turboLastActivatedAt\n      turboAmountLastRechargeDate\n      currentRefillEnergyAmount\n      maxRefillEnergyAmount\n      refillEnergyLastActivatedAt\n      refillEnergyAmountLastRechargeDate\n    }\n    bonusLeaderDamageEndAt\n    bonusLeaderDamageStartAt\n    bonusLeaderDamageMultiplier\n    nonce\n    spinEnergyNextRechargeAt\n    spinEnergyNonRefillable\n    spinEnergyRefillable\n    spinEnergyTotal\n    spinEnergyStaticLimit\n  }\n    mutation spinSlotMachine($payload: SlotMachineSpinInput!) {\n    slotMachineSpinV2(payload: $payload) {\n      gameConfig {\n        ...FragmentBossFightConfig\n      }\n      spinResults {\n        id\n        combination\n        rewardAmount\n        rewardType\n        questItemsFromSpin\n      }\n      spinsProcessedCount\n      previousProgressBarConfig {\n        id\n        questItem\n        status\n        requiredQuestItems\n        collectedQuestItems\n        rewardType\n        rewardAmount\n      }\n      nextProgressBarConfig {\n        id\n        questItem\n        status\n        requiredQuestItems\n        collectedQuestItems\n        rewardType\n        rewardAmount\n      }\n      progressBarReward {\n        rewardType\n        rewardAmount\n      }\n    }\n  }",
             }
         ]
-        result = await self._request(session, "POST", payload)
-        # print(result)
-        return result[0]["data"]["slotMachineSpinV2"]
+        result = await self._query(session, payload, "slotMachineSpinV2")
+        return result.unwrap()
 
     async def activate_boost(self, session: requests.AsyncSession, boost_type: str):
         booster_type = None
@@ -233,14 +409,16 @@ class MemefiGame:
             }
         ]
 
-        result = await self._request(session, "POST", payload)
-        print(result)
+        result = await self._query(session, payload, "telegramGameActivateBooster")
+        data = result.unwrap()
         if booster_type == "Turbo":
             self.max_allowed_turbo_boosts -= 1
         elif booster_type == "Recharge":
             self.max_allowed_recharge_boosts -= 1
 
-        return result[0]["data"]["telegramGameActivateBooster"]
+        LEDGER.record("memefi", "boost", 0, booster_type.lower())
+        self._observe_game_config(data, "other")
+        return data
 
     async def set_next_boss(self, session: requests.AsyncSession):
         payload = [
@@ -251,22 +429,8 @@ class MemefiGame:
             }
         ]
 
-        result = await self._request(session, "POST", payload)
-        return result
-
-    def generate_daily_combo_vector(self) -> list:
-        # Possible digits
-        digits = ["1", "2", "3", "4"]
-
-        # Generate all possible 4-digit sequences with repetition
-        sequences = list(itertools.product(digits, repeat=4))
-
-        # Number of sequences
-        num_sequences = len(sequences)
-
-        print(f"Number of possible sequences: {num_sequences}")
-
-        return [sequences, num_sequences, len(digits)]
+        result = await self._query(session, payload, "telegramGameSetNextBoss")
+        return result.unwrap()
 
     async def handle_boss_defeated(
         self, session: requests.AsyncSession, current_boss: dict
@@ -284,19 +448,35 @@ class MemefiGame:
             await self.set_next_boss(session)
         return False
 
+    def _combo_candidates(self, combo_log, _combo: list | None, brute: bool):
+        # candidate combos, lazily and without the ones already tried that day
+        if _combo and not brute:
+            combos = [c for c in ["".join(_combo)] if c not in combo_log.tried]
+            return iter(combos), len(combos)
+        return (
+            combo_log.candidates(COMBO_SEQUENCE_LENGTH),
+            combo_log.remaining(COMBO_SEQUENCE_LENGTH),
+        )
+
     async def play_for_daily_combo(self, _combo: list | None, brute: bool = False):
-        # Get possible daily combo vectors
-        [combos, num_sequences, num_digits] = (
-            [["".join(_combo)], 1, len(_combo)]
-            if _combo and not brute
-            else self.generate_daily_combo_vector()
+        combo_log = daily_combo.ComboLog.load(
+            self.combo_log_path, self.clock.utcnow().date()
         )
-        async with requests.AsyncSession() as session:
+        if combo_log.winner:
+            logging.info(f"Daily combo already found today: {combo_log.winner}")
+            return combo_log.winner
+
+        num_digits = len(_combo) if _combo and not brute else COMBO_SEQUENCE_LENGTH
+        combos, max_tries = self._combo_candidates(combo_log, _combo, brute)
+        if not max_tries:
+            logging.info("Every daily combo candidate was already tried today")
+            return None
+
+        async with self.session_factory() as session:
             game_config = await self.get_game_config(session)
             damage_per_hit = game_config.get("weaponLevel") + 1
 
             required_energy = num_digits * damage_per_hit
-            max_tries = required_energy * num_sequences
 
             logging.info(f"Required energy: {required_energy}")
             logging.info(f"Max tries: {max_tries}")
@@ -304,18 +484,39 @@ class MemefiGame:
             current_energy = game_config.get("currentEnergy")
             recharge_per_second = game_config.get("energyRechargeLevel") + 1
 
-            for index, combo in enumerate(combos):
-                logging.info(f"Trial {index+1} of {max_tries} *** Combo: {combo}")
+            index = 0
+            while (combo := next(combos, None)) is not None:
+                # a brute force can run past UTC midnight, when the combo
+                # changes: what was tried the day before says nothing about it
+                today = self.clock.utcnow().date()
+                if today.isoformat() != combo_log.date:
+                    logging.info("New UTC day, starting over on its daily combo")
+                    combo_log = daily_combo.ComboLog.load(self.combo_log_path, today)
+                    combos, max_tries = self._combo_candidates(
+                        combo_log, _combo, brute
+                    )
+                    index = 0
+                    continue
+                index += 1
+                logging.info(f"Trial {index} of {max_tries} *** Combo: {combo}")
                 # run process_taps for each combo
                 result = await self.process_taps(session, num_digits, combo=combo)
+                while not result.ok:
+                    # rejected for lack of energy, retry the combo once there is
+                    wait = required_energy / recharge_per_second
+                    logging.info(f"Energy is not enough, recharging for {wait} seconds")
+                    await self.clock.sleep(wait)
+                    result = await self.process_taps(session, num_digits, combo=combo)
+                result = result.data
                 current_energy = result.get("currentEnergy")
                 taps_reward = result.get("tapsReward")
                 logging.info(f"Taps processed: {result}")
+                combo_log.record(combo, won=bool(taps_reward))
 
                 if taps_reward:
                     logging.info(f"Reward: {taps_reward} *** Combo: {combo}")
-                    break
-                elif index != len(combos) and required_energy > current_energy:
+                    return combo
+                elif required_energy > current_energy:
                     # if energy is not enough, recharge
                     time_to_next_recharge = (
                         required_energy + (required_energy - current_energy)
@@ -323,213 +524,378 @@ class MemefiGame:
                     logging.info(
                         f"Energy is not enough, recharging for {time_to_next_recharge} seconds"
                     )
-                    await asyncio.sleep(time_to_next_recharge)
+                    await self.clock.sleep(time_to_next_recharge)
                 else:
                     # else, sleep for a while
-                    await asyncio.sleep(2)
+                    await self.clock.sleep(2)
+        return None
 
-    async def handle_boost_play(self, session: requests.AsyncSession, game_config):
-        current_turbo_boosts = game_config.get("freeBoosts").get("currentTurboAmount")
-        current_energy = game_config.get("currentEnergy")
-        current_boss = game_config.get("currentBoss")
-        current_boss_health = current_boss.get("currentHealth")
-        # recharge_per_second = game_config.get("energyRechargeLevel") + 1
+    async def run_turbo(self, session: requests.AsyncSession, game_config):
         damage_per_hit = game_config.get("weaponLevel") + 1
-        max_energy = game_config.get("maxEnergy")
-
-        # spin_energy_total = game_config.get("spinEnergyTotal")
-
-        max_taps = current_energy // damage_per_hit
-
-        estimated_boost_damage = (
-            TURBO_BOOST_DAMAGE_MULTIPLIER * max_taps * damage_per_hit
+        max_taps = self.batch_sizer.next_batch(game_config)
+        # turbo damage scales with the taps a batch can pay for; without one
+        # hit of energy every batch would be empty, keep the boost
+        if max_taps <= 0:
+            logging.info("Not enough energy for a turbo batch, keeping the boost")
+            return None
+
+        logging.info(f"Allowed turbo boosts left: {self.max_allowed_turbo_boosts}")
+        logging.info(
+            f"Estimated boost damage per batch: {TURBO_BOOST_DAMAGE_MULTIPLIER * max_taps * damage_per_hit}"
         )
-        recharge_per_second = game_config.get("energyRechargeLevel") + 1
-        
-        if (
-            self.max_allowed_turbo_boosts > 0
-            and current_turbo_boosts >= self.max_allowed_turbo_boosts
-        ):
-            while self.max_allowed_turbo_boosts:
-                logging.info(
-                    f"Allowed turbo boosts left: {self.max_allowed_turbo_boosts}"
-                )
-                logging.info(f"Estimated boost damage: {estimated_boost_damage}")
-                # logging.info(f"Current boss health: {current_boss_health}")
-                logging.info("Boost is ready to be activated")
 
-                # if  current energy is less than damage_per_hit(Least required energy), break
-                if current_energy < damage_per_hit:
-                    return
-                
-                result = await self.activate_boost(session, "turbo")
-               
-                boost_start_time = result.get("freeBoosts").get("turboLastActivatedAt")
-                logging.info(f"Boost activated: {result}")
-
-                estimated_boost_start_time = datetime.datetime.strptime(
-                    boost_start_time, "%Y-%m-%dT%H:%M:%S.%fZ"
-                )
-                estimated_boost_end_time = (
-                    estimated_boost_start_time
-                    + datetime.timedelta(seconds=TURBO_BOOST_DURATION)
-                )
+        sent_at = self.clock.time()
+        result = await self.activate_boost(session, "turbo")
+        received_at = self.clock.time()
+        logging.info(f"Boost activated: {result}")
 
-                # when using boost, energy isn't used. so spam the process_taps function to get max damage
-                while datetime.datetime.utcnow() < estimated_boost_end_time:
-                    logging.info("Boost is active, spamming process_taps")
-                    estimated_boost_damage = (
-                        TURBO_BOOST_DAMAGE_MULTIPLIER * max_taps * damage_per_hit
-                    )
-                    # estimated_boss_health = current_boss_health - estimated_boost_damage
-                    result = await self.process_taps(session, max_taps)
-                    # logging.info(f"Tap Result: {result}")
+        # the server stamps the activation while handling our request
+        boost_start_time = parse_iso8601(
+            result.get("freeBoosts").get("turboLastActivatedAt")
+        )
+        self.clock.observe(boost_start_time, sent_at, received_at)
+        boost_end_time = boost_start_time + TURBO_BOOST_DURATION
+        self.booster = "turbo"
 
-                    current_boss = result.get("currentBoss")
-                    current_boss_health = current_boss.get("currentHealth")
-                    current_energy = result.get("currentEnergy")
-                    damage_per_hit = result.get("weaponLevel") + 1
+        # when using boost, energy isn't used. so spam the process_taps function to get max damage
+        try:
+            while self.clock.now() < boost_end_time:
+                if max_taps <= 0:
+                    # no 0-tap batches: wait for a hit's worth of energy
+                    await self.clock.sleep(self.turbo_request_interval)
+                    result = await self.get_game_config(session)
+                    max_taps = self.batch_sizer.next_batch(result)
+                    continue
+                logging.info("Boost is active, spamming process_taps")
+                taps = await self.process_taps(session, max_taps)
+                if not taps.ok:
+                    logging.info(f"Taps rejected: {taps.error.message}")
+                    await self.clock.sleep(self.turbo_request_interval)
+                    continue
+                result = taps.data
+
+                current_boss = result.get("currentBoss")
+                max_taps = self.batch_sizer.next_batch(result)
 
-                    current_turbo_boosts = result.get("freeBoosts").get(
-                        "currentTurboAmount"
-                    )
+                logging.info(
+                    f"Current boss health: {current_boss.get('currentHealth')}"
+                )
 
-                    max_taps = current_energy // damage_per_hit
+                if await self.handle_boss_defeated(session, current_boss):
+                    return True
 
-                    logging.info(f"Current boss health: {current_boss_health}")
+                await self.clock.sleep(self.turbo_request_interval)
+        finally:
+            self.booster = ""
+        logging.info("Boost has ended")
+        return result
 
-                    if await self.handle_boss_defeated(session, current_boss):
-                        return True
+    def plan_boss_fight(self, game_config) -> planner.Plan:
+        return planner.plan_boss_fight(
+            game_config,
+            self.max_allowed_turbo_boosts,
+            self.max_allowed_recharge_boosts,
+            turbo_multiplier=TURBO_BOOST_DAMAGE_MULTIPLIER,
+            turbo_duration=TURBO_BOOST_DURATION,
+            max_boss_level=MAX_BOSS_LEVEL,
+            boss_health_growth=self.boss_health_growth,
+            target_energy=self.batch_sizer.target_energy(game_config),
+            cache=self.plan_cache,
+        )
 
-                    # if current_boss_health > estimated_boss_health:
-                    #     break
+    async def drain_spin_energy(self, session: requests.AsyncSession, game_config):
+        spin_energy = game_config.get("spinEnergyTotal") or 0
+        while spin_energy > 0:
+            spin_count = min(spin_energy, MAX_SPIN_COUNT)
+            result = await self.spin_slot_machine(session, spin_count)
+            self.spin_stats.add(result)
+            rewards = collections.Counter()
+            for spin in result.get("spinResults") or []:
+                rewards[spin.get("rewardType")] += spin.get("rewardAmount") or 0
+            for reward_type, amount in rewards.items():
+                LEDGER.record("memefi", f"spin.{str(reward_type).lower()}", amount)
+
+            processed = result.get("spinsProcessedCount") or 0
+            if result.get("gameConfig"):
+                game_config = result.get("gameConfig")
+                self._observe_game_config(game_config)
+                spin_energy = game_config.get("spinEnergyTotal") or 0
+            elif processed:
+                spin_energy -= processed
+            else:
+                logging.info("Slot machine processed no spins, stopping")
+                break
+        return game_config
 
-                    await asyncio.sleep(0.5)
-                logging.info("Boost has ended")
-                await asyncio.sleep(2)
+    async def run_spins(self, session: requests.AsyncSession):
+        # runs until the energy stops recharging; _follow_spins cancels it
+        # when allow_spin is turned off
+        overdue_wait = MIN_SPIN_RECHARGE_WAIT
+        while True:
+            game_config = await self.get_game_config(session)
+            # recharges only refill the refillable part
+            refilled = game_config.get("spinEnergyRefillable") or 0
+            logging.info(
+                f"Spin energy: {game_config.get('spinEnergyTotal')} "
+                f"({refilled} refillable)"
+            )
+            if refilled:
+                overdue_wait = MIN_SPIN_RECHARGE_WAIT
+            game_config = await self.drain_spin_energy(session, game_config)
+            logging.info(f"Spin energy exhausted, {self.spin_stats}")
+
+            next_recharge_at = game_config.get("spinEnergyNextRechargeAt")
+            if not next_recharge_at:
+                logging.info("No spin energy recharge scheduled, done spinning")
+                return
 
-                # request cool-down and wait for minimum recharge
-                # if current energy < damage_per_hit or if max_taps is 0: play request fails
-                # await asyncio.sleep(damage_per_hit / recharge_per_second)
-                # FIXME: problematic maths
-                # current_energy = current_energy + damage_per_hit * recharge_per_second
-                # max_taps = current_energy // damage_per_hit
-            return result
-        return game_config
+            time_to_recharge = self.clock.until(parse_iso8601(next_recharge_at))
+            if time_to_recharge <= 0:
+                # the recharge is due but has not shown up: back off, and stop
+                # once the longest wait brought nothing either
+                if overdue_wait > MAX_SPIN_RECHARGE_WAIT:
+                    logging.info("Spin energy recharge overdue, done spinning")
+                    return
+                time_to_recharge = overdue_wait
+                overdue_wait *= 2
+            time_to_recharge = max(time_to_recharge, MIN_SPIN_RECHARGE_WAIT)
+            await self.scheduler.sleep_until(
+                "spin energy recharge", self.clock.now() + time_to_recharge
+            )
 
     async def play_game(self, taps_count: int):
-        async with requests.AsyncSession() as session:
-            # if spin allowed, spin
-            try:
-                if self.allow_spin:
-                    while True:
-                        logging.info(f"Spinning for {DEFAULT_SPIN_COUNT}")
-                        spin_res = await self.spin_slot_machine(session, DEFAULT_SPIN_COUNT)
-                        logging.info("Spin done!")
-                        logging.info(spin_res.get('spinResults'))
-                        await asyncio.sleep(2)
-            except Exception as e:
-                print("Error spinning: ", e)
-            return
-            while True:
-                try:
-                    # if tap bot enabled, run tap bot
-                    if self.tap_bot:
-                        await self.run_tap_bot()
+        async with self.session_factory() as session:
+            # if spin allowed, spin alongside the fight
+            spin_task = await self._follow_spins(session, None)
+            # if tap bot enabled, run tap bot alongside the fight
+            tap_bot_task = await self._follow_tap_bot(session, None)
 
-                    game_config = await self.get_game_config(session)
-                    game_config = await self.handle_boost_play(session, game_config)
+            await self.warm_up(session)
 
-                    if game_config is True:
-                        break
+            # `taps_count` caps the taps sent per request
+            self.batch_sizer.max_taps = taps_count
 
-                    max_energy = game_config.get("maxEnergy")
-                    current_energy = game_config.get("currentEnergy")
-                    current_boss = game_config.get("currentBoss")
-                    current_boss_level = current_boss.get("level")
-                    current_boss_health = current_boss.get("currentHealth")
-                    recharge_per_second = game_config.get("energyRechargeLevel") + 1
-                    damage_per_hit = game_config.get("weaponLevel") + 1
-
-                    max_taps = current_energy // damage_per_hit
-
-                    logging.info(f"Max energy: {max_energy}")
-                    logging.info(f"Current energy: {current_energy}")
-                    logging.info(f"Current boss level: {current_boss_level}")
-                    logging.info(f"Current boss health: {current_boss_health}")
-
-                    result = await self.process_taps(session, max_taps)
-                    logging.info(f"Taps processed: {result}")
-
-                    max_energy = game_config.get("maxEnergy")
-                    new_current_energy = game_config.get("currentEnergy")
-                    current_boss = result.get("currentBoss")
-                    current_boss_health = current_boss.get("currentHealth")
-                    current_recharge_boosts = result.get("freeBoosts").get(
-                        "currentRefillEnergyAmount"
-                    )
-                    max_recharge_boosts = result.get("freeBoosts").get(
-                        "maxRefillEnergyAmount"
-                    )
-
-                    if await self.handle_boss_defeated(session, current_boss):
+            # taps and boosts return the updated config, only fetch it when
+            # the last step did not
+            game_config = None
+            try:
+                while True:
+                    try:
+                        tap_bot_task = await self._follow_tap_bot(
+                            session, tap_bot_task
+                        )
+                        spin_task = await self._follow_spins(session, spin_task)
+                        if game_config is None:
+                            game_config = await self.get_game_config(session)
+                        current_boss = game_config.get("currentBoss")
+
+                        if await self.handle_boss_defeated(session, current_boss):
+                            break
+                        if current_boss.get("currentHealth") == 0:
+                            game_config = None
+                            continue
+
+                        logging.info(f"Max energy: {game_config.get('maxEnergy')}")
+                        logging.info(
+                            f"Current energy: {game_config.get('currentEnergy')}"
+                        )
+                        logging.info(f"Current boss level: {current_boss.get('level')}")
+                        logging.info(
+                            f"Current boss health: {current_boss.get('currentHealth')}"
+                        )
+
+                        plan = self.plan_boss_fight(game_config)
+                        logging.info(f"Boss fight plan: {plan}")
+                        step = plan.next_step
+
+                        if step.action == planner.TURBO:
+                            if await self.run_turbo(session, game_config) is True:
+                                break
+                            game_config = None
+                            continue
+
+                        if step.action == planner.RECHARGE:
+                            logging.info("Recharge is ready to be activated")
+                            game_config = await self.activate_boost(session, "recharge")
+                            self.booster = "recharge"
+                            logging.info(f"Recharge activated: {game_config}")
+                            continue
+
+                        if step.action == planner.WAIT:
+                            logging.info(
+                                f"Waiting {step.seconds:.1f} seconds for energy"
+                            )
+                            # the recharged energy is spent
+                            self.booster = ""
+                            # a turbo window right after the wait gets a warm
+                            # connection
+                            warm = None
+                            if plan.followed_by(planner.TURBO):
+                                warm = lambda: self.warm_up(session)
+                            await self.scheduler.sleep_until(
+                                "energy", self.clock.now() + step.seconds, warm
+                            )
+                            game_config = None
+                            continue
+
+                        # drain in batches of at most taps_count; while energy is
+                        # still above the target the plan says tap again right away
+                        taps = self.batch_sizer.next_batch(game_config)
+                        sent_at = self.clock.monotonic()
+                        result = await self.process_taps(session, taps)
+                        self.batch_sizer.observe(taps, self.clock.monotonic() - sent_at)
+                        if not result.ok:
+                            # the energy in the config was stale, plan again
+                            logging.info(f"Taps rejected: {result.error.message}")
+                            game_config = None
+                            continue
+                        game_config = result.data
+                        logging.info(f"Taps processed: {taps} taps, {game_config}")
+
+                    except Exception as e:
+                        logging.error(f"Unexpected error: {e}")
                         break
+            finally:
+                # also on cancellation: the tap bot and the spins share the
+                # session
+                await tasks.cancel(tap_bot_task)
+                await tasks.cancel(spin_task)
+
+    async def _follow_tap_bot(
+        self, session: requests.AsyncSession, task: asyncio.Task | None
+    ) -> asyncio.Task | None:
+        # starts or stops the tap bot when the tap_bot setting changes; a tap
+        # bot that finished on its own stays finished
+        if self.tap_bot and task is None:
+            return asyncio.create_task(
+                tasks.supervise(
+                    "Tap bot",
+                    lambda: self.run_tap_bot(session),
+                    sleep=self.clock.sleep,
+                )
+            )
+        if not self.tap_bot and task is not None:
+            await tasks.cancel(task)
+            return None
+        return task
+
+    async def _follow_spins(
+        self, session: requests.AsyncSession, task: asyncio.Task | None
+    ) -> asyncio.Task | None:
+        # same for the spins and the allow_spin setting
+        if self.allow_spin and task is None:
+            return asyncio.create_task(
+                tasks.supervise(
+                    "Spins",
+                    lambda: self.run_spins(session),
+                    sleep=self.clock.sleep,
+                )
+            )
+        if not self.allow_spin and task is not None:
+            await tasks.cancel(task)
+            return None
+        return task
+
+    def status(self) -> dict:
+        game_config = self.game_config or {}
+        boss = game_config.get("currentBoss") or {}
+        tap_bot_config = self.tap_bot_config or {}
+        ends_at = tap_bot_config.get("endsAt")
+        updated_at = self.nonce_chain.updated_at
+        return {
+            "coins": game_config.get("coinsAmount"),
+            "boss": {
+                "level": boss.get("level"),
+                "health": boss.get("currentHealth"),
+                "max_health": boss.get("maxHealth"),
+            },
+            "energy": game_config.get("currentEnergy"),
+            "max_energy": game_config.get("maxEnergy"),
+            "target_energy": self.batch_sizer.target_energy(game_config)
+            if game_config
+            else None,
+            "nonce": {
+                "batches": self.nonce_chain.batches,
+                "age_seconds": (
+                    None if updated_at is None else self.clock.time() - updated_at
+                ),
+            },
+            "tap_bot": {
+                "starts_at": tap_bot_config.get("startsAt"),
+                "ends": deadline_status(self.clock, parse_iso8601(ends_at))
+                if ends_at
+                else None,
+                "used_attempts": tap_bot_config.get("usedAttempts"),
+                "total_attempts": tap_bot_config.get("totalAttempts"),
+            },
+            "spins": {
+                "requests": self.spin_stats.requests,
+                "spins": self.spin_stats.spins,
+                "rewards": dict(self.spin_stats.rewards),
+            },
+            "wakeups": scheduler_status(self.scheduler),
+            "clock": clock_status(self.clock),
+        }
 
-                    if (
-                        self.max_allowed_recharge_boosts > 0
-                        and current_recharge_boosts < max_recharge_boosts
-                    ):
-                        logging.info("Recharge is ready to be activated")
-
-                        result = await self.activate_boost(session, "recharge")
-                        logging.info(f"Recharge activated: {result}")
-
-                        self.max_allowed_recharge_boosts -= 1
-                        continue
-
-                    time_to_next_recharge = (
-                        max_energy + (max_energy - new_current_energy)
-                    ) / recharge_per_second
-
-                    logging.info(
-                        f"Estimated time to next recharge: {time_to_next_recharge} seconds"
-                    )
-
-                    await asyncio.sleep(time_to_next_recharge)
-
-                except Exception as e:
-                    logging.error(f"Unexpected error: {e}")
-                    break
+    def state(self) -> dict:
+        return {
+            "nonce": self.nonce_chain.nonce,
+            "nonce_updated_at": self.nonce_chain.updated_at,
+        }
 
-    async def run_tap_bot(self):
-        async with requests.AsyncSession() as session:
-            tap_bot_config = await self.get_tap_bot_config(session)
-            tap_bot_id = tap_bot_config.get("id")
+    def restore(self, data: dict):
+        # the saved nonce beats the default one, not one passed in explicitly;
+        # a stale one is resynced on the first batch
+        if self.nonce_chain.nonce == DEFAULT_NONCE and data.get("nonce"):
+            self.nonce_chain.nonce = data.get("nonce")
+            self.nonce_chain.updated_at = data.get("nonce_updated_at")
+
+    async def run_tap_bot(self, session: requests.AsyncSession):
+        self.tap_bot_config = await self.get_tap_bot_config(session)
+        while True:
+            tap_bot_config = self.tap_bot_config
             total_attempts = tap_bot_config.get("totalAttempts")
             used_attempts = tap_bot_config.get("usedAttempts")
             ends_at = tap_bot_config.get("endsAt")
+
             # no active tap bot
-            if tap_bot_id == "0" or not ends_at:
-                if total_attempts == used_attempts:
-                    logging.info("All tap bot attempts used, ending game session.")
+            if tap_bot_config.get("id") == "0" or not ends_at:
+                if used_attempts >= total_attempts:
+                    logging.info("All tap bot attempts used, stopping tap bot.")
                     return
 
-                logging.info("Tap bot not purchased, buying tap bot...")
-                await self.start_tap_bot(session)
-                return
+                logging.info("Tap bot not running, starting tap bot...")
+                self.tap_bot_config = await self.start_tap_bot(session)
+                if not self.tap_bot_config.get("endsAt"):
+                    logging.info("Tap bot did not start, stopping tap bot.")
+                    return
+                continue
 
-            # tap bot active
-            logging.info("Tap bot active, checking if session ended...")
-            if datetime.datetime.now() >= datetime.datetime.strptime(
-                ends_at, "%Y-%m-%dT%H:%M:%S.%fZ"
-            ):
-                logging.info("Tap bot session ended, claiming coins...")
-                await self.claim_tap_bot(session)
-                return
-            logging.info("Tap bot session not ended, waiting...")
+            # tap bot active, wake up right after the session ends
+            await self.scheduler.sleep_until(
+                "tap bot claim",
+                parse_iso8601(ends_at),
+                warm=lambda: self.warm_up(session),
+            )
+
+            logging.info("Tap bot session ended, claiming coins...")
+            # the claim returns the tap bot config, the coins are what the
+            # session dealt
+            claimed = 0
+            starts_at = tap_bot_config.get("startsAt")
+            if starts_at:
+                duration = parse_iso8601(ends_at) - parse_iso8601(starts_at)
+                claimed = (tap_bot_config.get("damagePerSec") or 0) * duration
+            self.tap_bot_config = await self.claim_tap_bot(session)
+            LEDGER.record("memefi", "tap_bot", claimed)
+            if self._coins is not None:
+                self._coins += claimed
 
 
 def main():
+    args = parse_args(__package__)
+    profiler = profiling.setup(args)
+
     jwt_token = input("Enter your JWT token: ").strip()
     if not jwt_token:
         print("Invalid JWT token, please try again")
@@ -593,17 +959,40 @@ def main():
         max_allowed_turbo_boosts,
         max_allowed_recharge_boosts,
         tap_bot,
-        allow_spin
+        allow_spin,
+        session_factory=transport.curl_session,
+        combo_log_path=os.path.join(args.state_dir, COMBO_LOG_FILE),
     )
 
     if platform.system() == "Windows":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    if daily_combo_sequences:
+    try:
+        if daily_combo_sequences:
+            asyncio.run(
+                runtime.run(
+                    args,
+                    profiler.wrap(
+                        "MemefiGame.play_for_daily_combo",
+                        memefi_game.play_for_daily_combo(
+                            daily_combo_sequences, brute=daily_combo_sequences == True
+                        ),
+                    ),
+                    games={"memefi": memefi_game},
+                    profiler=profiler,
+                )
+            )
+
         asyncio.run(
-            memefi_game.play_for_daily_combo(
-                daily_combo_sequences, brute=daily_combo_sequences == True
+            runtime.run(
+                args,
+                profiler.wrap(
+                    "MemefiGame.play_game",
+                    memefi_game.play_game(taps_count=MAX_TAPS_COUNT),
+                ),
+                games={"memefi": memefi_game},
+                profiler=profiler,
             )
         )
-
-    asyncio.run(memefi_game.play_game(taps_count=MAX_TAPS_COUNT))
+    finally:
+        profiler.stop()
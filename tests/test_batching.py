@@ -0,0 +1,41 @@
+import pytest
+
+from memefi.batching import DEFAULT_RTT, TapBatchSizer
+
+
+def _game_config(energy=1500, max_energy=1500, recharge_level=2, weapon_level=2):
+    return {
+        "currentEnergy": energy,
+        "maxEnergy": max_energy,
+        "energyRechargeLevel": recharge_level,
+        "weaponLevel": weapon_level,
+    }
+
+
+def test_target_leaves_room_for_the_regen_of_a_drain():
+    sizer = TapBatchSizer(max_taps=100)
+    # 1500 energy at 300 per batch: 5 round trips of DEFAULT_RTT at 3/s regen
+    assert sizer.target_energy(_game_config()) == 1500 - 3 * 5 * DEFAULT_RTT
+
+    sizer.observe(100, 2.0)
+    assert sizer.target_energy(_game_config()) == 1500 - 3 * 5 * 2.0
+
+
+def test_rtt_is_smoothed():
+    sizer = TapBatchSizer(max_taps=100)
+    sizer.observe(100, 1.0)
+    sizer.observe(100, 2.0)
+    assert sizer.rtt == pytest.approx(1.2)
+
+
+def test_target_never_drops_below_one_hit():
+    sizer = TapBatchSizer(max_taps=1)
+    sizer.observe(1, 100.0)
+    assert sizer.target_energy(_game_config(recharge_level=50)) == 3
+
+
+def test_next_batch_is_the_usable_energy_up_to_max_taps():
+    sizer = TapBatchSizer(max_taps=100)
+    assert sizer.next_batch(_game_config(energy=200)) == 66
+    assert sizer.next_batch(_game_config(energy=1500)) == 100
+    assert sizer.next_batch(_game_config(energy=2)) == 0
@@ -0,0 +1,33 @@
+import asyncio
+
+from common.clock import VirtualClock
+
+
+def test_virtual_clock_wakes_sleepers_in_deadline_order():
+    clock = VirtualClock(start=1000.0)
+    woke = []
+
+    async def sleeper(name: str, delay: float):
+        await clock.sleep(delay)
+        woke.append((name, clock.time()))
+
+    async def main():
+        await asyncio.gather(
+            sleeper("c", 30), sleeper("a", 10), sleeper("b", 20), sleeper("a2", 10)
+        )
+
+    asyncio.run(main())
+    # equal deadlines wake in the order they went to sleep
+    assert woke == [("a", 1010.0), ("a2", 1010.0), ("b", 1020.0), ("c", 1030.0)]
+
+
+def test_virtual_clock_nested_sleeps_add_up():
+    clock = VirtualClock(start=0.0)
+
+    async def main():
+        await clock.sleep(5)
+        await clock.sleep(0)
+        await clock.sleep(2.5)
+        return clock.time(), clock.monotonic()
+
+    assert asyncio.run(main()) == (7.5, 7.5)
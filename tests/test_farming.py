@@ -0,0 +1,76 @@
+import asyncio
+
+from common.clock import ServerClock, VirtualClock
+from common.farming import FarmingManager
+from common.scheduler import Scheduler
+from common.warmup import WARMUP_LEAD
+
+START = 1725000000.0
+ROUND = 8 * 60 * 60
+
+
+class Game:
+    # the part of BlumGame / TomarketGame FarmingManager uses
+    def __init__(self, clock, rounds: int):
+        self.clock = clock
+        self.rounds = rounds
+        self.end_time: float | None = None
+        self.calls = []
+
+    async def get_balance(self, session):
+        self.calls.append(("balance", self.clock.time()))
+        return {"end": self.end_time}
+
+    async def start_farming(self, session):
+        self.calls.append(("start", self.clock.time()))
+        if self.rounds:
+            self.rounds -= 1
+            self.end_time = self.clock.time() + ROUND
+        else:
+            self.end_time = None
+        return {"end": self.end_time}
+
+    async def claim_farming(self, session):
+        assert self.clock.time() >= self.end_time
+        self.calls.append(("claim", self.clock.time()))
+
+    async def warm_up(self, session):
+        self.calls.append(("warm", self.clock.time()))
+
+    def farming_end_time(self, data: dict) -> float | None:
+        return data.get("end")
+
+
+def _run(rounds: int, end_time: float | None = None):
+    clock = VirtualClock(start=START)
+    game = Game(clock, rounds)
+    farming = FarmingManager(game, Scheduler(ServerClock("test", clock)))
+    farming.end_time = end_time
+    game.end_time = end_time
+    asyncio.run(farming.run(session=None))
+    return game, farming
+
+
+def test_starts_farming_and_claims_each_round_at_its_end():
+    game, farming = _run(rounds=2)
+    assert game.calls == [
+        ("balance", START),
+        ("start", START),
+        ("warm", START + ROUND - WARMUP_LEAD),
+        ("claim", START + ROUND),
+        ("start", START + ROUND),
+        ("balance", START + ROUND),
+        ("warm", START + 2 * ROUND - WARMUP_LEAD),
+        ("claim", START + 2 * ROUND),
+        ("start", START + 2 * ROUND),
+        ("balance", START + 2 * ROUND),
+    ]
+    assert farming.rounds == 2
+    # the last start did not begin a round: nothing left to schedule
+    assert farming.end_time is None
+
+
+def test_a_restored_end_time_skips_the_first_balance_read():
+    game, farming = _run(rounds=0, end_time=START + 60)
+    assert game.calls[:2] == [("warm", START + 60 - WARMUP_LEAD), ("claim", START + 60)]
+    assert farming.rounds == 1
@@ -0,0 +1,24 @@
+import asyncio
+
+from common.mock_backend import run_offline
+
+
+def test_blum_spends_every_play_pass_and_claims_farming():
+    game, backend, elapsed = asyncio.run(run_offline("blum", hours=9))
+    assert elapsed == 9 * 3600
+    assert backend.play_passes == 0
+    assert backend.requests["POST /api/v1/game/play"] == 10
+    assert backend.requests["POST /api/v1/game/claim"] == 10
+    assert backend.requests["POST /api/v1/farming/claim"] == 1
+    assert backend.balance > 0
+
+
+def test_tomarket_plays_farms_and_checks_in():
+    game, backend, elapsed = asyncio.run(run_offline("tomarket", hours=4))
+    assert elapsed == 4 * 3600
+    assert backend.play_passes == 0
+    assert backend.requests["POST /tomarket-game/v1/game/play"] == 10
+    assert backend.requests["POST /tomarket-game/v1/game/claim"] == 10
+    assert backend.requests["POST /tomarket-game/v1/farming/claim"] == 1
+    assert backend.requests["POST /tomarket-game/v1/daily/claim"] == 1
+    assert backend.balance > 0
@@ -0,0 +1,23 @@
+from memefi import graphql
+
+
+def test_classify_by_code():
+    assert graphql.classify("whatever", "UNAUTHENTICATED") == graphql.AUTH
+    assert graphql.classify("whatever", "TOO_MANY_REQUESTS") == graphql.RATE_LIMIT
+
+
+def test_classify_known_messages():
+    assert graphql.classify("Invalid nonce") == graphql.NONCE_MISMATCH
+    assert graphql.classify("Not enough energy.") == graphql.INSUFFICIENT_ENERGY
+    assert graphql.classify("jwt expired") == graphql.AUTH
+    assert graphql.classify("Too many requests") == graphql.RATE_LIMIT
+
+
+def test_classify_falls_through_to_unknown():
+    # fragments of the known messages are not enough
+    assert graphql.classify("Not enough spin energy") == graphql.UNKNOWN
+    assert graphql.classify("Boss is not defeated") == graphql.UNKNOWN
+    assert graphql.classify("Invalid token field in input") == graphql.UNKNOWN
+    assert graphql.classify("", "INTERNAL_SERVER_ERROR") == graphql.UNKNOWN
+    error = graphql.Error.from_json({"message": "Energy boost unavailable"})
+    assert error.action == graphql.RAISE
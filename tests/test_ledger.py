@@ -0,0 +1,22 @@
+from common import ledger
+
+ENTRIES = [
+    ledger.Entry(1725000000.5, "blum", "game", "", 212.0, 2),
+    ledger.Entry(1725000030.0, "memefi", "taps", "turbo", 15000.0, 14),
+    ledger.Entry(1725000060.25, "tomarket", "farming", "", 180.0, 1),
+]
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "2024-08-30.ledger"
+    path.write_bytes(b"".join(ledger.encode(entry) for entry in ENTRIES))
+    assert list(ledger.iter_file(path)) == ENTRIES
+
+
+def test_truncated_tail_ends_the_file(tmp_path):
+    path = tmp_path / "2024-08-30.ledger"
+    data = b"".join(ledger.encode(entry) for entry in ENTRIES)
+    # a crash mid-write leaves part of the last record, down to half a length
+    for cut in (1, len(ledger.encode(ENTRIES[-1])) - 1):
+        path.write_bytes(data[:-cut])
+        assert list(ledger.iter_file(path)) == ENTRIES[:-1]
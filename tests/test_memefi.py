@@ -0,0 +1,58 @@
+import asyncio
+import secrets
+
+from common.clock import VirtualClock
+from common.mock_backend import MemefiBackend
+from memefi import MAX_TAPS_COUNT, MemefiGame
+
+
+def _play(game: MemefiGame, clock: VirtualClock, hours: float, *jobs):
+    # the fight until the last boss or `hours` of virtual time, with `jobs`
+    # running next to it
+    async def main():
+        tasks = [asyncio.ensure_future(game.play_game(taps_count=MAX_TAPS_COUNT))]
+        tasks += [asyncio.ensure_future(job) for job in jobs]
+        deadline = asyncio.ensure_future(clock.sleep(hours * 3600))
+        await asyncio.wait({tasks[0], deadline}, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks + [deadline]:
+            task.cancel()
+        await asyncio.gather(*tasks, deadline, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_play_game_spends_boosts_and_resyncs_the_nonce():
+    clock = VirtualClock(start=1725000000.0)
+    # strict: the client starts on its own default nonce, so the first batch
+    # is rejected and has to be resynced
+    backend = MemefiBackend(clock, strict_nonce=True)
+    game = MemefiGame(
+        "mock",
+        max_allowed_turbo_boosts=3,
+        max_allowed_recharge_boosts=3,
+        clock=clock,
+        session_factory=backend.curl_session,
+    )
+    resyncs = []
+    resync_nonce = game._resync_nonce
+
+    async def counting_resync(session):
+        resyncs.append(clock.time())
+        return await resync_nonce(session)
+
+    game._resync_nonce = counting_resync
+
+    async def steal_the_nonce():
+        # another client taps in between: the chain is stale again
+        await clock.sleep(3600)
+        backend.nonce = secrets.token_hex(32)
+
+    _play(game, clock, 4, steal_the_nonce())
+
+    assert backend.turbo_boosts == 0
+    assert backend.recharge_boosts == 0
+    assert backend.boss_level > 1
+    assert len(resyncs) == 2
+    assert resyncs[1] >= 1725000000.0 + 3600
+    assert game.nonce_chain.nonce == backend.nonce
+    assert game.nonce_chain.batches > 0
@@ -0,0 +1,30 @@
+import asyncio
+
+from common.clock import VirtualClock
+from memefi.nonce import NonceChain
+
+
+def test_batches_take_the_chain_in_turn():
+    clock = VirtualClock(start=100.0)
+    chain = NonceChain("n0", clock)
+    seen = []
+
+    async def batch(index: int):
+        async with chain as nonce:
+            seen.append((index, nonce))
+            # the next batch must not run while this one is in flight
+            await clock.sleep(1)
+            chain.advance(f"n{index + 1}")
+
+    async def main():
+        tasks = [asyncio.create_task(batch(index)) for index in range(4)]
+        await asyncio.sleep(0)
+        assert chain.busy
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert seen == [(0, "n0"), (1, "n1"), (2, "n2"), (3, "n3")]
+    assert chain.nonce == "n4"
+    assert chain.batches == 4
+    assert chain.updated_at == 104.0
+    assert not chain.busy
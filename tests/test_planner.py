@@ -0,0 +1,75 @@
+from memefi import planner
+
+
+def _game_config(energy=1500, turbo=3, recharge=3, level=1, health=25000):
+    return {
+        "currentEnergy": energy,
+        "maxEnergy": 1500,
+        "energyRechargeLevel": 2,
+        "weaponLevel": 2,
+        "currentBoss": {"level": level, "currentHealth": health, "maxHealth": 25000},
+        "freeBoosts": {
+            "currentTurboAmount": turbo,
+            "currentRefillEnergyAmount": recharge,
+        },
+    }
+
+
+def _plan(game_config, **kwargs):
+    return planner.plan_boss_fight(
+        game_config,
+        max_turbo_boosts=10,
+        max_recharge_boosts=10,
+        turbo_multiplier=10,
+        turbo_duration=10,
+        max_boss_level=15,
+        **kwargs,
+    )
+
+
+def test_full_bar_opens_with_a_turbo():
+    plan = _plan(_game_config())
+    assert plan.next_step.action == planner.TURBO
+    assert plan.total_time < float("inf")
+
+
+def test_no_boosts_and_no_energy_waits_for_a_hit():
+    plan = _plan(_game_config(energy=0, turbo=0, recharge=0))
+    assert plan.next_step.action == planner.WAIT
+    assert plan.next_step.seconds > 0
+
+
+def test_allowances_cap_the_boosts():
+    state = planner.FightState.from_game_config(
+        _game_config(turbo=5, recharge=5), 1, 0, 15
+    )
+    assert (state.turbo_boosts, state.recharge_boosts) == (1, 0)
+
+
+def test_later_bosses_grow_by_boss_health_growth():
+    state = planner.FightState.from_game_config(
+        _game_config(level=14, health=1000), 0, 0, 15, boss_health_growth=2.0
+    )
+    assert state.remaining_health == 1000 + 50000
+
+
+def test_below_one_hit_is_not_full():
+    state = planner.FightState(2, 1500, 3, 3, 1000, 0, 0, target_energy=1)
+    assert state.target_energy == 3
+    assert not state.is_full
+
+
+def test_cache_keeps_the_policy_per_boost_inventory_and_level():
+    cache = {}
+    first = _plan(_game_config(), cache=cache)
+    assert list(cache) == [(3, 3, 1, planner.BOSS_HEALTH_GROWTH)]
+
+    # a cache hit only previews the next steps of the cached policy
+    again = _plan(_game_config(energy=700), cache=cache)
+    assert again.policy == first.policy
+    assert again.total_time == first.total_time
+    assert len(again.steps) <= planner.PREVIEW_STEPS
+
+    # a boost spent is a new key and a full evaluation
+    _plan(_game_config(turbo=2), cache=cache)
+    assert len(cache) == 2
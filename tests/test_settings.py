@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import pytest
+
+from common import settings
+from common.metrics import Registry
+
+
+class Game:
+    SETTINGS = {"max_boosts": int, "interval": float, "tap_bot": bool}
+
+    def __init__(self):
+        self.max_boosts = 3
+        self.interval = 10.0
+        self.tap_bot = False
+
+
+def test_validate_accepts_and_converts():
+    section = {"max_boosts": 5, "interval": 2, "tap_bot": True}
+    assert settings.validate("game", Game(), section) == {
+        "max_boosts": 5,
+        "interval": 2.0,
+        "tap_bot": True,
+    }
+
+
+@pytest.mark.parametrize(
+    "section",
+    [
+        [],
+        {"unknown": 1},
+        {"max_boosts": "5"},
+        {"max_boosts": 1.5},
+        {"max_boosts": True},
+        {"tap_bot": 1},
+        {"interval": -1.0},
+    ],
+)
+def test_validate_rejects(section):
+    with pytest.raises(settings.SettingsError):
+        settings.validate("game", Game(), section)
+
+
+def test_apply_only_sets_what_changed():
+    game = Game()
+    reloader = settings.SettingsReloader("unused", {"game": game}, Registry())
+    reloader._apply({"game": {"max_boosts": 5, "interval": 2.0}})
+    assert (game.max_boosts, game.interval) == (5, 2.0)
+
+    # the game used two boosts; an unrelated edit must not hand them back
+    game.max_boosts = 3
+    reloader._apply({"game": {"max_boosts": 5, "interval": 4.0}})
+    assert (game.max_boosts, game.interval) == (3, 4.0)
+
+    reloader._apply({"game": {"max_boosts": 7}})
+    assert game.max_boosts == 7
+
+
+def test_invalid_reload_keeps_the_settings(tmp_path):
+    path = tmp_path / "settings.json"
+    game = Game()
+    reloader = settings.SettingsReloader(str(path), {"game": game}, Registry())
+
+    async def main():
+        path.write_text(json.dumps({"game": {"interval": 1.5}}))
+        await reloader.load()
+        path.write_text(json.dumps({"game": {"interval": 3.0, "tap_bot": "yes"}}))
+        assert not await reloader.reload()
+        assert (game.interval, game.tap_bot) == (1.5, False)
+        path.write_text(json.dumps({"game": {"interval": 3.0}}))
+        assert await reloader.reload()
+
+    asyncio.run(main())
+    assert game.interval == 3.0
@@ -4,10 +4,28 @@ import logging
 from aiohttp import ClientSession
 import platform
 
+from common import profiling, runtime, tasks, transport
+from common.status import clock_status, deadline_status, scheduler_status
+from common.farming import FarmingManager
+from common.ledger import LEDGER
+from common.shutdown import DRAIN
+from common.scheduler import Scheduler
+from common.singleflight import SingleFlight
+from common.cli import parse_args
+from common.clock import SYSTEM_CLOCK, ServerClock
+from common.metrics import REGISTRY
+
 
 # jwt expires in 30 days
 
+BASE_URL = "https://api-web.tomarket.ai/tomarket-game/v1"
 MAX_POINTS = 600
+# re-read the pass count from the server every this many games
+PASS_RECONCILE_EVERY = 10
+MAX_GAME_ERRORS = 3
+# seconds a game runs before its reward is claimed, and between games
+GAME_DURATION = 30.0
+GAME_INTERVAL = 10.0
 
 FARM_ID = "53b22103-c7ff-413d-bc63-20f6fb806a07"
 DROP_GAME_ID = "59bcd12e-04e2-404c-a172-311a0084587d"
@@ -17,13 +35,33 @@ logging.basicConfig(level=logging.INFO)
 
 
 class TomarketGame:
-    def __init__(self, access_token: str):
+    # live settings, see common.settings
+    SETTINGS = {"game_duration": float, "game_interval": float}
+
+    def __init__(
+        self,
+        access_token: str,
+        clock=SYSTEM_CLOCK,
+        session_factory=aiohttp.ClientSession,
+        base_url: str = BASE_URL,
+    ):
         self.access_token = access_token
-        self.base_url = "https://api-web.tomarket.ai/tomarket-game/v1"
+        self.session_factory = session_factory
+        self.base_url = base_url
         self.headers = {
             "Authorization": f"{self.access_token}",
             "Content-Type": "application/json",
         }
+        self.clock = ServerClock(__package__, clock)
+        self.scheduler = Scheduler(self.clock)
+        self.single_flight = SingleFlight(__package__)
+        self.farming = FarmingManager(self, self.scheduler)
+        self.game_duration = GAME_DURATION
+        self.game_interval = GAME_INTERVAL
+        # live state for the status endpoint
+        self.play_passes: int | None = None
+        self.balance = None
+        self.daily: dict | None = None
 
     async def _request(
         self,
@@ -34,10 +72,20 @@ class TomarketGame:
         **kwargs,
     ):
         url = f"{self.base_url}{endpoint}"
+        REGISTRY.counter("tomarket.requests").inc()
+        REGISTRY.counter(f"tomarket.requests.{method} {endpoint}").inc()
+        sent_at = self.clock.time()
         try:
-            async with session.request(
+            async with DRAIN.request(), session.request(
                 method, url, headers=self.headers, **kwargs
             ) as response:
+                received_at = self.clock.time()
+                REGISTRY.histogram("tomarket.request_seconds").observe(
+                    received_at - sent_at
+                )
+                self.clock.observe_date_header(
+                    response.headers.get("Date"), sent_at, received_at
+                )
                 response.raise_for_status()
 
                 if is_response_json:
@@ -45,9 +93,25 @@ class TomarketGame:
                 else:
                     return await response.text()
         except aiohttp.ClientError as e:
+            REGISTRY.counter("tomarket.request_errors").inc()
             logging.error(f"Request failed: {e}")
             raise
 
+    async def warm_up(self, session: ClientSession):
+        # resolves the host and leaves an open connection in the session's
+        # pool ahead of the requests that matter (see common.warmup); the
+        # response itself does not matter
+        started = self.clock.monotonic()
+        try:
+            async with session.request("HEAD", self.base_url):
+                pass
+        except aiohttp.ClientError as e:
+            logging.warning(f"Warm-up failed: {e}")
+            return
+        REGISTRY.histogram("tomarket.warmup_seconds").observe(
+            self.clock.monotonic() - started
+        )
+
     async def get_hidden_tasks(self, session: ClientSession):
         data = await self._request(session, "GET", "/tasks/hidden")
         #      [
@@ -64,7 +128,8 @@ class TomarketGame:
         # ]
         return data.get("data")
 
-    async def claim_task(self, session: ClientSession, task_id: int):
+    async def claim_task(self, session: ClientSession, task_id: int, score: int = 0):
+        # `score` is the task's score from get_hidden_tasks, for the ledger
         payload = {"task_id": task_id}
         data = await self._request(
             session, "POST", "/tasks/claim", json=payload, is_response_json=False
@@ -74,22 +139,87 @@ class TomarketGame:
         #   "message": "",
         #   "data": "ok"
         # }
+        LEDGER.record(__package__, "task", score)
         return data
 
-    async def start_farming(self, session: ClientSession) -> str:
-        data = await self._request(session, "POST", "/farming/start")
+    async def start_farming(self, session: ClientSession, farming_id: str = FARM_ID):
+        payload = {"game_id": farming_id}
+        data = await self._request(session, "POST", "/farming/start", json=payload)
         # {
-        #     "startTime": 1725178325416,
-        #     "endTime": 1725207125416,
-        #     "earningsRate": "0.002",
-        #     "balance": "0"
+        #   "status": 0,
+        #   "message": "",
+        #   "data": {
+        #     "game_id": "53b22103-c7ff-413d-bc63-20f6fb806a07",
+        #     "round_id": "503b9f17-7d5d-4bbc-aa01-e4031fc06b4e",
+        #     "start_at": 1725278438,
+        #     "end_at": 1725289238,
+        #     ...
+        #   }
         # }
         return data
 
-    async def claim_farming(self, session: ClientSession, farming_id: str):
-        data = await self._request(session, "POST", "/farming/claim")
+    async def claim_farming(self, session: ClientSession, farming_id: str = FARM_ID):
+        payload = {"game_id": farming_id}
+        data = await self._request(session, "POST", "/farming/claim", json=payload)
         return data
 
+    def farming_end_time(self, data: dict) -> float | None:
+        # start response ({"data": {...}}) or balance data ({"farming": {...}})
+        if data and "data" in data:
+            data = data.get("data")
+        farming = data.get("farming", data) if data else None
+        if not farming or not farming.get("end_at"):
+            return None
+        return farming.get("end_at")
+
+    async def claim_daily(self, session: ClientSession, daily_id: str = DAILY_ID):
+        payload = {"game_id": daily_id}
+        data = await self._request(session, "POST", "/daily/claim", json=payload)
+        return data
+
+    async def check_in_daily(self, session: ClientSession, daily: dict) -> dict:
+        previous_counter = daily.get("check_counter") or 0
+        previous_ymd = daily.get("last_check_ymd")
+
+        result = await self.claim_daily(session)
+        logging.info(f"Daily check-in claimed: {result}")
+
+        # the claim response may carry the new daily state, otherwise read it
+        # back from the balance
+        checked = (result or {}).get("data")
+        if not isinstance(checked, dict) or "next_check_ts" not in checked:
+            balance = await self.get_balance(session)
+            checked = balance.get("daily") or {}
+
+        counter_advanced = (checked.get("check_counter") or 0) > previous_counter
+        day_advanced = checked.get("last_check_ymd") != previous_ymd
+        if not counter_advanced and not day_advanced:
+            raise Exception(f"Daily check-in was not recorded: {checked}")
+
+        logging.info(
+            f"Daily check-in {checked.get('check_counter')} recorded for {checked.get('last_check_ymd')}"
+        )
+        return checked
+
+    async def run_daily(self, session: ClientSession):
+        # a check-in still due in the future (restored state) saves the read
+        daily = self.daily
+        if not daily or (daily.get("next_check_ts") or 0) <= self.clock.now():
+            balance = await self.get_balance(session)
+            daily = self.daily = balance.get("daily") or {}
+        while True:
+            next_check_ts = daily.get("next_check_ts")
+            if next_check_ts:
+                await self.scheduler.sleep_until(
+                    "daily check-in",
+                    next_check_ts,
+                    warm=lambda: self.warm_up(session),
+                )
+
+            daily = self.daily = await self.check_in_daily(session, daily)
+            if (daily.get("next_check_ts") or 0) <= self.clock.now():
+                raise Exception(f"Daily check-in did not reschedule: {daily}")
+
     async def start_game_session(self, session: ClientSession) -> str:
         payload = {"game_id": DROP_GAME_ID}
         data = await self._request(
@@ -105,9 +235,11 @@ class TomarketGame:
         data = await self._request(
             session, "POST", "/game/claim", json=payload, is_response_json=False
         )
+        LEDGER.record(__package__, "game", points)
         return data
 
     async def get_balance(self, session: ClientSession):
+        # concurrent reads (game passes, farming, daily check-in) share one call
         #         {
         #   "status": 0,
         #   "message": "",
@@ -137,52 +269,161 @@ class TomarketGame:
         #     }
         #   }
         # }
+        return await self.single_flight.do(
+            ("balance", session), lambda: self._get_balance(session)
+        )
+
+    async def _get_balance(self, session: ClientSession):
+        sent_at = self.clock.time()
         result = await self._request(session, "GET", "/user/balance")
-        return result.get("data")
+        data = result.get("data")
+        if data and data.get("timestamp"):
+            self.clock.observe(
+                data.get("timestamp"), sent_at, self.clock.time(), resolution=1.0
+            )
+        return data
 
-    async def play_game(self):
-        async with aiohttp.ClientSession() as session:
+    async def play_game(self, session: ClientSession):
+        # passes only change through our own claims, so the balance is read
+        # once and the passes are counted down locally; the server count is
+        # re-read every PASS_RECONCILE_EVERY games and after an error
+        self.play_passes = None
+        games_since_reconcile = 0
+        errors = 0
+        while True:
             try:
-                while True:
+                if (
+                    self.play_passes is None
+                    or games_since_reconcile >= PASS_RECONCILE_EVERY
+                ):
                     balance = await self.get_balance(session)
-                    current_balance = balance.get("available_balance")
-                    current_game_passes = balance.get("play_passes")
+                    self.play_passes = balance.get("play_passes")
+                    games_since_reconcile = 0
+                    self.balance = balance.get("available_balance")
+                    logging.info(f"Current balance: {self.balance}")
 
-                    if current_game_passes <= 0:
-                        logging.info("All game passes used, ending game session.")
-                        break
+                if self.play_passes <= 0:
+                    logging.info("All game passes used, ending game session.")
+                    break
 
-                    logging.info(f"Current balance: {current_balance}")
-                    logging.info(f"Current game passes: {current_game_passes}")
+                logging.info(f"Current game passes: {self.play_passes}")
 
-                    round_id = await self.start_game_session(session)
-                    logging.info(
-                        f"Game started with ID: {DROP_GAME_ID}\nRound ID: {round_id}"
-                    )
+                round_id = await self.start_game_session(session)
+                logging.info(
+                    f"Game started with ID: {DROP_GAME_ID}\nRound ID: {round_id}"
+                )
 
-                    logging.info("Waiting for game session to end...")
-                    await asyncio.sleep(30)  # Wait 30 seconds before claiming
+                logging.info("Waiting for game session to end...")
+                await self.clock.sleep(self.game_duration)
 
-                    result = await self.claim_rewards(
-                        session, DROP_GAME_ID, points=MAX_POINTS
-                    )
-                    logging.info(f"Rewards claimed: {result}")
+                result = await self.claim_rewards(
+                    session, DROP_GAME_ID, points=MAX_POINTS
+                )
+                logging.info(f"Rewards claimed: {result}")
+                self.play_passes -= 1
+                games_since_reconcile += 1
+                errors = 0
 
-                    if current_game_passes - 1 == 0:
-                        logging.info("All game passes used, ending game session.")
-                        break
-                    logging.info("Sleeping for 10 seconds before new game...")
-                    await asyncio.sleep(10)
+                if self.play_passes == 0:
+                    logging.info("All game passes used, ending game session.")
+                    break
+                logging.info(
+                    f"Sleeping for {self.game_interval} seconds before new game..."
+                )
+                await self.clock.sleep(self.game_interval)
 
             except Exception as e:
                 logging.error(f"Unexpected error: {e}")
+                errors += 1
+                if errors >= MAX_GAME_ERRORS:
+                    break
+                # re-read the passes from the server before the next game
+                self.play_passes = None
+
+        REGISTRY.log("tomarket.")
+
+    def status(self) -> dict:
+        daily = self.daily or {}
+        return {
+            "balance": self.balance,
+            "play_passes": self.play_passes,
+            "farming": {
+                "end": deadline_status(self.clock, self.farming.end_time),
+                "rounds": self.farming.rounds,
+            },
+            "daily": {
+                "next_check": deadline_status(self.clock, daily.get("next_check_ts")),
+                "check_counter": daily.get("check_counter"),
+                "last_check_ymd": daily.get("last_check_ymd"),
+            },
+            "wakeups": scheduler_status(self.scheduler),
+            "clock": clock_status(self.clock),
+        }
+
+    def state(self) -> dict:
+        return {"farming_end": self.farming.end_time, "daily": self.daily}
+
+    def restore(self, data: dict):
+        # a round end still in the future saves the first balance read
+        self.farming.end_time = data.get("farming_end")
+        self.daily = data.get("daily")
+
+    async def run_farming(self, session: ClientSession):
+        await tasks.supervise(
+            "Farming",
+            lambda: self.farming.run(session),
+            sleep=self.clock.sleep,
+        )
+
+    async def run_daily_check_in(self, session: ClientSession):
+        await tasks.supervise(
+            "Daily check-in",
+            lambda: self.run_daily(session),
+            sleep=self.clock.sleep,
+        )
+
+    async def run(self, wrap=None):
+        # the jobs share one session: with --transport http2 their concurrent
+        # requests are multiplexed on one connection. `wrap(name, coro)` is
+        # profiling.SamplingProfiler.wrap
+        wrap = wrap or (lambda name, coro: coro)
+        async with self.session_factory() as session:
+            await self.warm_up(session)
+            async with asyncio.TaskGroup() as group:
+                group.create_task(
+                    wrap("TomarketGame.play_game", self.play_game(session))
+                )
+                group.create_task(
+                    wrap("TomarketGame.run_farming", self.run_farming(session))
+                )
+                group.create_task(
+                    wrap(
+                        "TomarketGame.run_daily_check_in",
+                        self.run_daily_check_in(session),
+                    )
+                )
 
 
 def main():
+    args = parse_args(__package__)
+    profiler = profiling.setup(args)
+
     access_token = input("Enter your access token: ").strip()
-    game = TomarketGame(access_token)
+    game = TomarketGame(
+        access_token, session_factory=transport.session_factory(args.transport)
+    )
 
     if platform.system() == "Windows":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    asyncio.run(game.play_game())
+    try:
+        asyncio.run(
+            runtime.run(
+                args,
+                game.run(profiler.wrap),
+                games={"tomarket": game},
+                profiler=profiler,
+            )
+        )
+    finally:
+        profiler.stop()